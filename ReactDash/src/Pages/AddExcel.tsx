@@ -1,6 +1,11 @@
-import { useState, useRef } from "react";
+import { useState, useRef, useEffect } from "react";
 import TheDrawer from "../Components/drawer";
 
+//polling limits: give up after this long, or after this many failed polls in a row
+const POLL_INTERVAL_MS = 1000;
+const MAX_WAIT_MS = 2 * 60 * 60 * 1000;
+const MAX_POLL_FAILURES = 5;
+
 export function AddExcel() {
   const [file, setFile] = useState<File | null>(null);
   const [loading, setLoading] = useState(false);
@@ -8,6 +13,15 @@ export function AddExcel() {
   const [error, setError] = useState("");
 
   const fileInputRef = useRef<HTMLInputElement>(null);
+  //polling stops once the page is left (the job itself keeps running)
+  const mounted = useRef(true);
+
+  useEffect(() => {
+    mounted.current = true;
+    return () => {
+      mounted.current = false;
+    };
+  }, []);
 
   const handleFileChange = (e: React.ChangeEvent<HTMLInputElement>) => {
     setFile(e.target.files?.[0] ?? null);
@@ -23,6 +37,66 @@ export function AddExcel() {
     }
   };
 
+  const fetchJob = async (url: string) => {
+    const res = await fetch(url);
+    const body = await res.json().catch(() => ({}));
+    return { res, body };
+  };
+
+  //resolves with the finished job, or null if the page was left first
+  const waitForJob = async (jobId: string) => {
+    const finished = ["succeeded", "failed", "cancelled", "interrupted"];
+    const deadline = Date.now() + MAX_WAIT_MS;
+    let failures = 0;
+
+    while (mounted.current) {
+      if (Date.now() > deadline) {
+        throw new Error(`Upload is still running after ${MAX_WAIT_MS / 60000} minutes, check the upload jobs later`);
+      }
+      await new Promise((resolve) => setTimeout(resolve, POLL_INTERVAL_MS));
+      if (!mounted.current) break;
+
+      const polled = await fetchJob(`http://127.0.0.1:5000/upload-jobs/${jobId}/progress`)
+        .catch((err) => (err instanceof Error ? err : new Error("network error")));
+      if (polled instanceof Error) {
+        //network error, the server may just be restarting
+        if (++failures >= MAX_POLL_FAILURES) {
+          throw new Error(`Lost track of the upload job: ${polled.message}`);
+        }
+        continue;
+      }
+      const { res, body } = polled;
+
+      if (res.status === 404) {
+        throw new Error(body.error || "Upload job not found");
+      }
+      if (!res.ok) {
+        if (++failures >= MAX_POLL_FAILURES) {
+          throw new Error(body.error || `Lost track of the upload job (${res.status})`);
+        }
+        continue;
+      }
+      failures = 0;
+
+      const { status, progress } = body;
+      if (progress) {
+        setMessage(
+          `Parsed ${progress.rows_parsed}, translated ${progress.rows_translated}, ` +
+            `inserted ${Math.min(progress.en_rows_inserted, progress.tet_rows_inserted)} rows...`
+        );
+      }
+
+      if (finished.includes(status)) {
+        const job = await fetchJob(`http://127.0.0.1:5000/upload-jobs/${jobId}`);
+        if (!job.res.ok) {
+          throw new Error(job.body.error || `Couldn't load the upload job (${job.res.status})`);
+        }
+        return job.body;
+      }
+    }
+    return null;
+  };
+
   const handleUpload = async () => {
     if (!file) return;
 
@@ -43,13 +117,22 @@ export function AddExcel() {
         body: formData,
       });
 
-      const result = await response.json();
+      const queued = await response.json();
+
+      //409 with a job id: the same file is already uploading, follow that job
+      if (!response.ok && !(response.status === 409 && queued.job_id)) {
+        throw new Error(queued.error || "Upload failed");
+      }
+
+      //upload runs as a background job, poll until it finishes
+      const job = await waitForJob(queued.job_id);
+      if (!job) return;
 
-      if (!response.ok) {
-        throw new Error(result.error || "Upload failed");
+      if (job.status !== "succeeded") {
+        throw new Error(job.error || `Upload ${job.status}`);
       }
 
-      setMessage(`✅ Upload successful! ${result.rows_inserted ?? ""}`);
+      setMessage(`✅ Upload successful! ${job.result?.rows_inserted ?? ""}`);
       setFile(null);
     } catch (err: any) {
       setError(
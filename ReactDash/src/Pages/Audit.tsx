@@ -93,6 +93,23 @@ export default function Audit() {
             <p>No duplicate scientific names</p>
           )}
 
+          <h3>Possible near duplicates</h3>
+          {result.report.near_duplicates_count > 0 ? (
+            <ul>
+              {[
+                ...(result.report.near_duplicate_scientific_names ?? []),
+                ...(result.report.near_duplicate_common_names ?? []),
+              ].map((c: any) => (
+                <li key={c.names.join("|")}>
+                  {[...c.names, ...c.existing.map((n: string) => `${n} (stored)`)].join(", ")}
+                  {" "}({Math.round(c.score * 100)}%)
+                </li>
+              ))}
+            </ul>
+          ) : (
+            <p>No near duplicates</p>
+          )}
+
           <h3>Invalid leaf types</h3>
           {result.report.leaf_type_invalid_values.length > 0 ? (
             <ul>
@@ -136,26 +136,16 @@ export function EditEntry() {
         setError('')
 
         try {
-            const { error } = await supabase!
-                .from('species_en')
-                .delete()
-                .eq('species_id', ID)
-
-            if (error) {
-                console.error('========== SUPABASE ERROR DETAILS ==========')
-                console.error('Error object:', error)
-                console.error('Error code:', error.code)
-                console.error('Error details:', error.details)
-                console.error('Error hint:', error.hint)
-                console.error('Full error JSON:', JSON.stringify(error, null, 2))
-                console.error('===========================================')
-                
-                let errorMsg = `Error Code: ${error.code}\n`
-                errorMsg += `Message: ${error.message}\n`
-                if (error.details) errorMsg += `Details: ${error.details}\n`
-                if (error.hint) errorMsg += `Hint: ${error.hint}`
-                
-                throw new Error(errorMsg)
+            //through the backend so the delete is logged and devices get it on sync
+            const token = localStorage.getItem("admin_token")
+            const res = await fetch(`http://127.0.0.1:5000/api/species/${ID}`, {
+                method: "DELETE",
+                headers: { Authorization: token || "" },
+            })
+
+            if (!res.ok) {
+                const body = await res.json().catch(() => ({}))
+                throw new Error(body.error || `Delete failed (${res.status})`)
             }
 
             setResetKey(prev => prev + 1)
@@ -221,44 +211,39 @@ export function EditEntry() {
         setError('')
 
         try {
-            const { error } = await supabase!
-                .from('species_en')
-                .update([
-                    { 
-                        scientific_name: formData.scientificName,
-                        common_name: formData.commonName ,
-                        etymology: formData.etymology,
-                        habitat: formData.habitat,
-                        identification_character: formData.identificationCharacteristics,
-                        leaf_type: formData.leafType,
-                        fruit_type: formData.fruitType,
-                        phenology: formData.phenology,
-                        seed_germination: formData.seedGermination,
-                        pest: formData.pests 
-                    }
-                ])
-                .eq('species_id', ID)
-                .select()
-
-            if (error) {
-                console.error('========== SUPABASE ERROR DETAILS ==========')
-                console.error('Error object:', error)
-                console.error('Error code:', error.code)
-                console.error('Error details:', error.details)
-                console.error('Error hint:', error.hint)
-                console.error('Full error JSON:', JSON.stringify(error, null, 2))
-                console.error('===========================================')
-                
-                let errorMsg = `Error Code: ${error.code}\n`
-                errorMsg += `Message: ${error.message}\n`
-                if (error.details) errorMsg += `Details: ${error.details}\n`
-                if (error.hint) errorMsg += `Hint: ${error.hint}`
-                
-                throw new Error(errorMsg)
+            //through the backend so the edit is logged and devices get it on sync
+            const token = localStorage.getItem("admin_token")
+            const res = await fetch(`http://127.0.0.1:5000/api/species/${ID}`, {
+                method: "PUT",
+                headers: {
+                    "Content-Type": "application/json",
+                    Authorization: token || "",
+                },
+                body: JSON.stringify({
+                    scientific_name: formData.scientificName,
+                    common_name: formData.commonName,
+                    etymology: formData.etymology,
+                    habitat: formData.habitat,
+                    identification_character: formData.identificationCharacteristics,
+                    leaf_type: formData.leafType,
+                    fruit_type: formData.fruitType,
+                    phenology: formData.phenology,
+                    seed_germination: formData.seedGermination,
+                    pest: formData.pests
+                }),
+            })
+
+            if (!res.ok) {
+                const body = await res.json().catch(() => ({}))
+                throw new Error(body.error || `Update failed (${res.status})`)
             }
+            const body = await res.json()
+            const stale: string[] = body.tetum_stale || []
 
             setResetKey(prev => prev + 1)
-            setStatus('Species added successfully!')
+            setStatus(stale.length
+                ? `Species updated, Tetum not translated for: ${stale.join(', ')}`
+                : 'Species added successfully!')
             setError('')
             setRowSelected(false)
             setID(-1)
@@ -4,27 +4,57 @@ import os
 
 SUPABASE_URL = "https://miwuxlsmwcsqgprtvcdm.supabase.co"
 SUPABASE_KEY = "sb_publishable_Nffc0mLAzEW6PgeXQJ5JCw_NvTMiN_w"  
-TABLES = ["species_en", "species_tet", "users"]  
+TABLES = {"species_en": "species_id", "species_tet": "species_id", "users": "user_id"}  #table -> primary key
 OUTPUT_DIR = "supabase_json_exports"
+PAGE_SIZE = 1000
 
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
-for table in TABLES:
-    url = f"{SUPABASE_URL}/rest/v1/{table}?select=*"
-    headers = {
-        "apikey": SUPABASE_KEY,
-        "Authorization": f"Bearer {SUPABASE_KEY}",
-        "Accept": "application/json"
-    }
-    
+headers = {
+    "apikey": SUPABASE_KEY,
+    "Authorization": f"Bearer {SUPABASE_KEY}",
+    "Accept": "application/json"
+}
+session = requests.Session()
+
+
+def iter_rows(table, key):
+    """walks table by primary key so exports arent cut off at max-rows"""
+    last = None
+    while True:
+        params = {"select": "*", "order": f"{key}.asc", "limit": PAGE_SIZE}
+        if last is not None:
+            params[key] = f"gt.{last}"
+
+        response = session.get(f"{SUPABASE_URL}/rest/v1/{table}", headers=headers, params=params)
+        if response.status_code != 200:
+            raise Exception(f"{response.status_code} - {response.text}")
+
+        page = response.json()
+        if not page:
+            return
+        yield from page
+        last = page[-1][key]
+
+
+for table, key in TABLES.items():
     print(f"Fetching table: {table}")
-    response = requests.get(url, headers=headers)
-    
-    if response.status_code == 200:
-        data = response.json()
-        output_file = os.path.join(OUTPUT_DIR, f"{table}.json")
-        with open(output_file, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
-        print(f"Saved {len(data)} records to {output_file}")
-    else:
-        print(f"Failed to fetch {table}: {response.status_code} - {response.text}")
+    output_file = os.path.join(OUTPUT_DIR, f"{table}.json")
+
+    try:
+        #writing rows as they arrive instead of holding the whole table
+        count = 0
+        tmp_file = output_file + ".tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            f.write("[\n")
+            for row in iter_rows(table, key):
+                if count:
+                    f.write(",\n")
+                f.write(json.dumps(row, indent=2, ensure_ascii=False))
+                count += 1
+            f.write("\n]\n")
+        #only replace the old export once the new one is complete
+        os.replace(tmp_file, output_file)
+        print(f"Saved {count} records to {output_file}")
+    except Exception as e:
+        print(f"Failed to fetch {table}: {e}")
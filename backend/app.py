@@ -1,20 +1,28 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from werkzeug.utils import secure_filename
 from datetime import datetime
-import tempfile
-import asyncio
-from uploader import process_file, translate_to_tetum
-from supabase import create_client, Client
+import json
+from concurrent.futures import TimeoutError as FutureTimeout
+from uploader import translation_worker, translation_cache, glossary
+from supabase import create_client, Client, ClientOptions
 from flask_cors import CORS
 import os
 from flask_cors import CORS
 from pathlib import Path
 from dotenv import load_dotenv
-from audit import read_file_to_df, audit_dataframe
+from audit import audit_file, iter_audit_chunks, AuditAccumulator
+from species_index import ScientificNameIndex
+from upload_planner import plan_upload
+from upload_jobs import UPLOAD_MODES
+from parse_cache import parse_cache
 from google.oauth2 import id_token
 from google.auth.transport import requests as google_requests
 import bcrypt
 from auth_authz import register_auth_routes, require_role, get_admin_user
+from pagination import iter_table, iter_table_ranges, count_rows, TableReadError
+import changelog
+from concurrent_queries import run_queries, QueryError, QUERY_TIMEOUT
+from bundle_cache import BundleCache, bundle_etag, choose_encoding, ENCODING_SUFFIXES
 
 app = Flask(__name__)
 CORS(app, supports_credentials=True)
@@ -28,7 +36,11 @@ load_dotenv()
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+#every request gets QUERY_TIMEOUT, paginated reads are bounded page by page
+supabase: Client = create_client(
+    SUPABASE_URL, SUPABASE_KEY,
+    options=ClientOptions(postgrest_client_timeout=QUERY_TIMEOUT)
+)
 
 #register auth and authz routes
 register_auth_routes(app, supabase)
@@ -40,11 +52,40 @@ register_auth_routes(app, supabase)
 from media import register_media_routes
 register_media_routes(app, supabase)
 
+#register species edit routes (dashboard edits, logged for sync)
+from species_routes import register_species_routes
+register_species_routes(app, supabase)
+
 SUPABASE_URL_TETUM = os.getenv("VITE_SUPABASE_URL_TETUM")
 SUPABASE_SERVICE_KEY_TETUM = os.getenv("VITE_SUPABASE_PUBLISHABLE_KEY_TETUM")
 
 print("Supabase URL:", SUPABASE_URL)
 
+#bundle snapshot cache, set BUNDLE_CACHE_DIR to keep a copy on disk across restarts.
+#keyed by changelog version: a write that doesnt log a change (eg an edit
+#made straight in supabase) isnt seen until POST /api/bundle/invalidate
+bundle_cache = BundleCache(os.getenv("BUNDLE_CACHE_DIR"))
+
+
+def load_bundle(version):
+    """cached bundle variants + row count for version, building on a miss"""
+    variants = bundle_cache.get_or_build(version, lambda: build_bundle(version))
+    return variants, bundle_cache.row_count(version)
+
+#register sync routes
+from sync import register_sync_routes, read_changes, fetch_rows
+register_sync_routes(app, supabase, load_bundle)
+
+#register bulk upload job routes (/upload-species, /upload-jobs)
+from upload_jobs import register_upload_job_routes
+#app.run(debug=True) at the bottom imports this module twice: in the
+#reloader parent, which only watches files, and in the child that serves
+#(WERKZEUG_RUN_MAIN=true). only a serving process picks up unfinished jobs
+upload_runner = register_upload_job_routes(
+    app, supabase,
+    recover=__name__ != "__main__" or os.environ.get("WERKZEUG_RUN_MAIN") == "true"
+)
+
 #supabase = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
 #supabase_tetum = create_client(SUPABASE_URL_TETUM, SUPABASE_SERVICE_KEY_TETUM)
 
@@ -53,11 +94,103 @@ def get_bundle():
     """
     this endpoint returns the full dataset the app needs on first install
     will include en_species, tet_species, media,latest version nnumber
+
+    bundle is built once per changelog version and served from the
+    snapshot cache after that (raw, gzip or br depending on Accept-Encoding).
+    ETag is the version so clients that already have it get a 304.
+    only writes that log a change move the version: dashboard edits go
+    through /api/species/<id>, anything else needs /api/bundle/invalidate
+
+    ?format=ndjson streams the bundle row by row instead (see stream_bundle)
     """
     #client sends version in use... default to 0
     ###client_version = request.args.get("version", type=int, default=0)
+    bundle_format = request.args.get("format", "json")
+    if bundle_format not in ("json", "ndjson"):
+        return jsonify({"error": "format must be json or ndjson"}), 400
+
+    latest_version, err = get_latest_version()
+    if err:
+        return jsonify({"error": err}), 500
+
+    #device already has this version (any encoding), nothing to send
+    for encoding in [*ENCODING_SUFFIXES, "ndjson"]:
+        if request.if_none_match.contains(bundle_etag(latest_version, encoding)):
+            resp = Response(status=304)
+            resp.set_etag(bundle_etag(latest_version, encoding))
+            resp.vary.add("Accept-Encoding")
+            return resp
+
+    if bundle_format == "ndjson":
+        resp = Response(
+            stream_with_context(stream_bundle(latest_version)),
+            mimetype="application/x-ndjson"
+        )
+        resp.set_etag(bundle_etag(latest_version, "ndjson"))
+        resp.headers["Cache-Control"] = "no-cache"
+        return resp
+
+    try:
+        variants, _ = load_bundle(latest_version)
+    except BundleBuildError as e:
+        return jsonify({"error": str(e)}), 500
+
+    #compressed copies were made once at build time, just pick one
+    encoding = choose_encoding(request.accept_encodings, variants)
+
+    resp = Response(variants[encoding], mimetype="application/json")
+    if encoding != "identity":
+        resp.headers["Content-Encoding"] = encoding
+    resp.set_etag(bundle_etag(latest_version, encoding))
+    resp.vary.add("Accept-Encoding")
+    #raw + every compressed size so we can see what the links are saving
+    resp.headers["X-Bundle-Size"] = ", ".join(
+        f"{enc}={len(body)}" for enc, body in variants.items()
+    )
+    #let clients revalidate every time, the 304 is cheap
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp
+
+
+@app.post("/api/bundle/invalidate")
+def invalidate_bundle():
+    """
+    admin only. the bundle is cached per changelog version, so rows
+    changed without a changelog entry (edited straight in supabase,
+    a sql script, ...) are never served. this logs a change with no
+    entity id: the version moves, the next /api/bundle is rebuilt and
+    /api/sync sends every device the new bundle
+    """
+    admin_id, err = get_admin_user(supabase)
+    if err:
+        return jsonify({"error": err[0]}), err[1]
+
+    try:
+        version = changelog.log_change(supabase, "species", None, "REFRESH")
+    except Exception as e:
+        return jsonify({"error": f"couldnt log the refresh: {e}"}), 500
 
-    #get latest version from changelog
+    bundle_cache.invalidate()
+    return jsonify({"status": "invalidated", "latest_version": version}), 200
+
+
+class BundleBuildError(Exception):
+    pass
+
+
+#tables in the bundle and the key each one is paged by
+BUNDLE_TABLES = [
+    ("species_en", "species_id"),
+    ("species_tet", "species_id"),
+    ("media", "media_id"),
+]
+
+
+def get_latest_version():
+    """
+    latest version from changelog
+    returns (version, error message)
+    """
     version_resp = (
         supabase.table("changelog")
         .select("version")
@@ -68,36 +201,62 @@ def get_bundle():
 
     #if changelog is empty or something goes wrong
     if version_resp.data is None:
-        return jsonify({"error": "reading version failure"}), 500
+        return None, "reading version failure"
 
     #starting with version 1 if no entries yet
     if version_resp.data:
-        latest_version = version_resp.data[0]["version"]
-    else:
-        latest_version = 1
-    
-    #getting english species
-    en_resp = supabase.table("species_en").select("*").execute()
-    if en_resp.data is None:
-        return jsonify({"error": "couldnt load species_en"}), 500
+        return version_resp.data[0]["version"], None
+    return 1, None
 
-    #get tetum species
-    tet_resp = supabase.table("species_tet").select("*").execute()
-    if tet_resp.data is None:
-        return jsonify({"error": "couldnt load species_tet"}), 500
 
-    #get media entries
-    media_resp = supabase.table("media").select("*").execute()
-    if media_resp.data is None:
-        return jsonify({"error": "couldnt load media"}), 500
+def build_bundle(latest_version):
+    """
+    reads everything for the bundle from supabase
+    only runs on a cache miss (new version or cold start)
+    """
+    try:
+        #getting english species, tetum species and media entries in parallel.
+        #no deadline on the whole walk, a big catalogue takes many pages
+        #and each page request has its own timeout
+        tables = run_queries({
+            table: (lambda table=table, key=key: list(iter_table(supabase, table, key=key)))
+            for table, key in BUNDLE_TABLES
+        }, timeout=None)
+    except QueryError as e:
+        raise BundleBuildError(str(e))
 
     #retrunign it all as one bundle
-    return jsonify({
-        "version": latest_version,
-        "species_en": en_resp.data,
-        "species_tet": tet_resp.data,
-        "media":media_resp.data
-    })
+    return {"version": latest_version, **tables}
+
+
+def stream_bundle(latest_version):
+    """
+    ndjson version of the bundle, one json record per line:
+        {"type": "header", "version": N}
+        {"type": "species_en", "row": {...}}   (then species_tet, media)
+        {"type": "end", "counts": {...}}
+
+    rows go out as each page comes back from supabase so memory per
+    request is one page no matter how big the tables get.
+    rows may be newer than the header version if an edit lands mid-stream,
+    thats fine since the next sync from that version replays it anyway.
+    client should treat a stream without the end record as failed
+    """
+    yield json.dumps({"type": "header", "version": latest_version}) + "\n"
+
+    counts = {}
+    for table, key in BUNDLE_TABLES:
+        counts[table] = 0
+        try:
+            for row in iter_table(supabase, table, key=key):
+                yield json.dumps({"type": table, "row": row}, ensure_ascii=False) + "\n"
+                counts[table] += 1
+        except TableReadError as e:
+            #headers are already sent so the error has to go in the stream
+            yield json.dumps({"type": "error", "error": str(e)}) + "\n"
+            return
+
+    yield json.dumps({"type": "end", "counts": counts}) + "\n"
 
 #       
 @app.get("/api/species/changes")
@@ -112,39 +271,29 @@ def get_species_changes():
     if since_version is None:
         return jsonify({"error": "since_version required"}), 400
 
-    #getting all changelog entris related tospecies
-    #occured after clients last known version
-    changes = (
-        supabase.table("changelog")
-        .select("entity_id", "species")
-        .gt("version", since_version)
-        .execute()
-    )
+    #species changed after clients last known version, from the latest
+    #change index (same read as /api/sync, so compacted history still counts)
+    try:
+        latest_version, changes, has_unknown = read_changes(supabase, since_version)
+    except TableReadError as e:
+        return jsonify({"error": str(e)}), 500
 
     #if nothing changes, client must be up to date
-    if not changes.data:
+    if latest_version == since_version:
         return jsonify({
             "up_to_date": True,
             "latest_version": since_version,
             "row_count":0
         })
-    
-    changed_species_ids = {
-        row["entity_id"]
-        for row in changes.data
-        if row["entity_id"] is not None
-    }
-
-    row_count = len(changed_species_ids)
 
-    #finding latest version # on server
-    latest_version = max(row["version"] for row in changes.data)
+    row_count = len(changes["species"])
 
     #threshold: if too many changes, no point having incremental syncing
     #will just pull the bundle
     THRESHOLD = 20
 
-    if row_count > THRESHOLD:
+    #bulk changes without ids cant be listed, only the bundle has them
+    if row_count > THRESHOLD or has_unknown:
         return jsonify({
             "up_to_date": False,
             "force_bundle": True,
@@ -176,24 +325,13 @@ def get_species_incremental():
     if since_version is None:
         return jsonify({"error": "sicne_version required"}), 400
     
-    #find ewhich species ids changed
-    changes = (
-        supabase.table("changelog")
-        .select("species_id, version")
-        .gt("version", since_version)
-        .execute()
-    )
+    #find ewhich species ids changed (latest change index, see /api/species/changes)
+    try:
+        latest_version, changes, has_unknown = read_changes(supabase, since_version)
+    except TableReadError as e:
+        return jsonify({"error": str(e)}), 500
 
-    if not changes.data:
-        return jsonify({
-            "species_en": [],
-            "species_tet": [],
-            "latest_version": since_version
-        })
-    #deduplicating
-    species_ids = list({row["species_id"] for row in changes.data})
-    
-    latest_version =max(row["version"] for row in changes.data)
+    species_ids = list(changes["species"])
 
     if not species_ids:
         return jsonify({
@@ -201,109 +339,107 @@ def get_species_incremental():
             "species_tet": [],
             "latest_version": latest_version
         })
-    #fetch latest en species rows
-    species_en = (
-        supabase.table("species_en")
-        .select("*")
-        .in_("species_id", species_ids)
-        .execute()
-    )
-
-    #fetch latest tet species rows
-    species_tet = (
-        supabase.table("species_tet")
-        .select("*")
-        .in_("species_id", species_ids)
-        .execute()
-    )
-
-    if species_en.data is None or species_tet.data is None:
+    #fetch latest en and tet species rows
+    try:
+        species_en = fetch_rows(supabase, "species_en", "species_id", species_ids)
+        species_tet = fetch_rows(supabase, "species_tet", "species_id", species_ids)
+    except TableReadError:
         return jsonify({"error": "failed to fetch incremental species"}), 500
+
     return jsonify({
         "latest_version": latest_version,
-        "species_en": species_en.data,
-        "species_tet": species_tet.data
+        "species_en": species_en,
+        "species_tet": species_tet
     })
-"""
-This endpoint accepts an Excel or CSV file upload 
-and processes it to populate the species_en and species_tet tables in the database.
-There is a species.xlsx sample file within the backend folder for testing.
-Or you can also run > curl -X POST http://127.0.0.1:5000/upload-species -F "file=@species.xlsx"
-"""
-@app.route("/upload-species", methods=["POST"])
-def upload_species_file():
+#names already in species_en, for the audit's duplicate check against the db
+species_index = ScientificNameIndex(supabase)
+
+
+def current_species_index():
+    """the refreshed index, None (check skipped) if the db cant be read"""
+    try:
+        species_index.refresh()
+        return species_index
+    except Exception as e:
+        print("Species index refresh failed:", e)
+        return None
+
+
+def parsed_upload():
     """
-    this is an admin only endpoint
-    for uploading species data
+    the sheet a request is about: an uploaded "file", parsed into the parse
+    cache, or the file_id (?file_id= or form field) of one parsed earlier.
+    returns (file_id, parsed path, None) or (None, None, (error, status))
     """
-    #checking peermissions
-    # admin_id, err = get_admin_user(supabase)
-    # if err:
-    #     return jsonify({"error": err[0]}), err[1]
-
-    #at this point we've confirmed theyre admin
+    file_id = request.args.get("file_id") or request.form.get("file_id")
+    if file_id:
+        try:
+            path = parse_cache.get(file_id)
+        except ValueError as e:
+            return None, None, (str(e), 400)
+        if path is None:
+            return None, None, ("unknown or expired file_id, upload the file again", 404)
+        return file_id, path, None
 
     if "file" not in request.files:
-        return jsonify({"error": "No file part"}), 400
-    
-    uploaded_file = request.files["file"]
+        return None, None, ("No file part", 400)
 
+    uploaded_file = request.files["file"]
     if uploaded_file.filename == "":
-        return jsonify({"error": "No selected file"}), 400
+        return None, None, ("No selected file", 400)
 
-    try:
-        suffix = ".xlsx" if uploaded_file.filename.endswith(".xlsx") else ".csv"
-        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-            uploaded_file.save(tmp.name)
-            temp_path = tmp.name
+    file_id, path = parse_cache.save_upload(uploaded_file)
+    return file_id, path, None
 
-        en_result = asyncio.run(process_file(temp_path, translate=False))  # English
-        tet_result = asyncio.run(process_file(temp_path, translate=True))   # Tetum
-
-        rows_inserted = min(
-            en_result["rows_inserted"],
-            tet_result["rows_inserted"]
-        )
-        
-        log_change(
-            "species",
-            None,
-            f"BULK_INSERT ({rows_inserted} rows)"
-        )
-
-        return jsonify({
-            "status": "success",
-            "message": "Data uploaded to species_en & species_tet tables"
-        }), 200
 
+def stream_audit(parsed_path, file_id, name_index=None):
+    """
+    ndjson audit, one record per chunk so the dashboard can show progress:
+        {"type": "partial", "report": {...}}                  (report has "partial": true)
+        {"type": "report", "report": {...}, "file_id": "..."} final
+    or {"type": "error", "error": "..."} if the file cant be read
+    """
+    try:
+        acc = None
+        for acc in iter_audit_chunks(parsed_path, name_index=name_index):
+            yield json.dumps({"type": "partial", "report": acc.report(partial=True)}) + "\n"
+        report = acc.report() if acc else AuditAccumulator(name_index).report()
+        yield json.dumps({"type": "report", "report": report, "file_id": file_id}) + "\n"
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
-    
+        yield json.dumps({"type": "error", "error": str(e)}) + "\n"
 
 
 @app.post("/audit-species")
 def audit_species_file():
     """
     Upload a file and return a data quality report (NO upload to Supabase).
+    The file is audited in chunks so memory stays bounded for big exports.
+    Names are also checked against species_en (existing_scientific_names),
+    left out of the report if the database cant be read.
+    ?stream=1 returns ndjson partial reports as it goes (see stream_audit)
+    The response has a file_id: the parsed sheet stays in the parse cache
+    and /upload-species?file_id=... uploads it without parsing it again
+    (a file_id also works here, to audit it again)
     """
-    if "file" not in request.files:
-        return jsonify({"error": "No file part"}), 400
+    streaming = request.args.get("stream", "").lower() in ("1", "true")
+    try:
+        file_id, parsed_path, err = parsed_upload()
+        if err:
+            return jsonify({"error": err[0]}), err[1]
 
-    uploaded_file = request.files["file"]
-    if uploaded_file.filename == "":
-        return jsonify({"error": "No selected file"}), 400
+        name_index = current_species_index()
 
-    try:
-        suffix = ".xlsx" if uploaded_file.filename.endswith(".xlsx") else ".csv"
-        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-            uploaded_file.save(tmp.name)
-            temp_path = tmp.name
+        if streaming:
+            return Response(
+                stream_with_context(stream_audit(parsed_path, file_id, name_index)),
+                mimetype="application/x-ndjson"
+            )
 
-        df = read_file_to_df(temp_path)
-        report = audit_dataframe(df)
+        report = audit_file(parsed_path, name_index=name_index)
 
         return jsonify({
             "status": "success",
+            "file_id": file_id,
             "report": report
         }), 200
 
@@ -311,6 +447,31 @@ def audit_species_file():
         return jsonify({"status": "error", "error": str(e)}), 500
 
 
+@app.post("/plan-species")
+def plan_species_upload():
+    """
+    Dry run of /upload-species: predicts what uploading the file would cost
+    (rows to insert/update/skip, translator calls, requests, wall time).
+    Nothing is written or translated. ?mode=insert (default) or upsert
+    Takes the file or the file_id from /audit-species
+    """
+    mode = request.args.get("mode") or request.form.get("mode") or "insert"
+    if mode not in UPLOAD_MODES:
+        return jsonify({"error": f"mode must be one of {list(UPLOAD_MODES)}"}), 400
+
+    try:
+        file_id, parsed_path, err = parsed_upload()
+        if err:
+            return jsonify({"error": err[0]}), err[1]
+
+        return jsonify({
+            "status": "success",
+            "file_id": file_id,
+            "plan": plan_upload(parsed_path, mode)
+        }), 200
+
+    except Exception as e:
+        return jsonify({"status": "error", "error": str(e)}), 500
 
 
 @app.route("/upload", methods=["POST"])
@@ -444,127 +605,181 @@ def upload():
         
 
 
-async def translateMultipleTexts(texts):
-    tasks = [translate_to_tetum(text) for text in texts]
-    
-    results = await asyncio.gather(*tasks)
-    
-    return results
+#seconds a /translate request waits for the translator before giving up
+TRANSLATE_TIMEOUT = float(os.getenv("TRANSLATE_TIMEOUT", "60"))
 
 
 @app.route("/translate", methods=["POST"])
 def translate():
-    print(f"Raw request data: {request.data}")
-    data = request.json
+    """
+    {"text": [strings]} -> [tetum strings] in the same order
+    repeats are translated once, cached text is served straight away and the
+    rest goes through the shared translation worker (bounded concurrency)
+    """
+    data = request.get_json(silent=True) or {}
     texts = data.get('text', [])
-    
+
     if not texts:
         return {"error": "No text provided"}, 400
-    
-    
-    print(f"Received text: '{texts}'")
-    array = asyncio.run(translateMultipleTexts(texts))
-
-    print(f"Translated Text = '{array}")
-    
-    return jsonify(array)
+    if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+        return {"error": "text must be a list of strings"}, 400
 
-# Analytics Endpoints
-@app.route("/analytics/overview", methods=["GET"])
-def analytics_overview():
     try:
-        users_res = supabase.table("users").select(
-            "user_id, is_active", count="exact"
-        ).execute()
+        array = translation_worker.translate_many(texts, timeout=TRANSLATE_TIMEOUT)
+    except FutureTimeout:
+        return {"error": "Translation timed out"}, 504
 
-        analytics_res = supabase.table("analytics").select(
-            "duration", count="exact"
-        ).execute()
-
-        species_res = supabase.table("species_en").select(
-            "species_id", count="exact"
-        ).execute()
+    return jsonify(array)
 
-        media_res = supabase.table("media").select(
-            "species_id"
-        ).execute()
+@app.get("/translate/cache-stats")
+def translate_cache_stats():
+    """hit/miss counters for the shared translation memory"""
+    return jsonify(translation_cache.stats()), 200
 
-        total_users = users_res.count or 0
-        active_users = sum(1 for u in users_res.data if u["is_active"])
 
-        total_logins = analytics_res.count or 0
+@app.get("/translate/glossary")
+def get_glossary():
+    """glossary version, size and coverage (share of lookups it answered)"""
+    return jsonify(glossary.stats()), 200
 
-        durations = [a["duration"] for a in analytics_res.data]
-        avg_duration = round(
-            sum(durations) / len(durations), 2
-        ) if durations else 0
 
-        total_species = species_res.count or 0
-        species_with_media = len(set(m["species_id"] for m in media_res.data))
+@app.put("/translate/glossary")
+def extend_glossary():
+    """
+    admin only, {"entries": {"english": "tetum", ...}} is merged into the
+    glossary file and its version bumped
+    """
+    admin_id, err = get_admin_user(supabase)
+    if err:
+        return jsonify({"error": err[0]}), err[1]
 
-        return jsonify({
-            "total_users": total_users,
-            "active_users": active_users,
-            "total_logins": total_logins,
-            "average_session_duration": avg_duration,
-            "total_species": total_species,
-            "species_with_media": species_with_media
-        }), 200
+    entries = (request.get_json(silent=True) or {}).get("entries")
+    if not isinstance(entries, dict) or not entries or not all(
+        isinstance(k, str) and k.strip() and isinstance(v, str) and v.strip()
+        for k, v in entries.items()
+    ):
+        return jsonify({"error": "entries must be a non empty {text: translation} object"}), 400
 
+    try:
+        version = glossary.add(entries)
     except Exception as e:
-        app.logger.exception("Analytics overview failed")
         return jsonify({"error": str(e)}), 500
-    
-@app.route("/analytics/users", methods=["GET"])
-def analytics_users():
+
+    return jsonify({"version": version, "added": len(entries)}), 200
+
+# Analytics Endpoints
+@app.route("/analytics/overview", methods=["GET"])
+def analytics_overview():
     try:
-        users_res = supabase.table("users").select(
-            "user_id, name, role, is_active"
-        ).execute()
+        #four independent reads, run side by side
+        results = run_queries({
+            "users": user_totals,
+            "analytics": login_totals,
+            "species": lambda: count_rows(supabase, "species_en", key="species_id"),
+            "media": species_with_media_count,
+        })
+    except QueryError as e:
+        app.logger.error("Analytics overview failed: %s", e)
+        return jsonify({"error": str(e), "failed_queries": e.failures}), 504 if e.timed_out else 500
+
+    total_users, active_users = results["users"]
+    total_logins, total_duration = results["analytics"]
 
-        analytics_res = supabase.table("analytics").select(
-            "user_id, duration, login_time"
-        ).execute()
+    avg_duration = round(
+        total_duration / total_logins, 2
+    ) if total_logins else 0
 
-        analytics_by_user = {}
+    return jsonify({
+        "total_users": total_users,
+        "active_users": active_users,
+        "total_logins": total_logins,
+        "average_session_duration": avg_duration,
+        "total_species": results["species"],
+        "species_with_media": results["media"]
+    }), 200
+
+
+#walking the tables page by page, only keeping running totals
+def user_totals():
+    total_users = 0
+    active_users = 0
+    for u in iter_table(supabase, "users", "user_id, is_active", key="user_id"):
+        total_users += 1
+        if u["is_active"]:
+            active_users += 1
+    return total_users, active_users
+
+
+def login_totals():
+    total_logins = 0
+    total_duration = 0
+    for a in iter_table_ranges(supabase, "analytics", "duration, login_time", order="login_time"):
+        total_logins += 1
+        total_duration += a["duration"]
+    return total_logins, total_duration
+
+
+def species_with_media_count():
+    return len(set(
+        m["species_id"]
+        for m in iter_table(supabase, "media", "media_id, species_id", key="media_id")
+    ))
+
+
+def analytics_by_user():
+    """
+    per user running totals instead of holding every analytics record
+    uid -> [login_count, total_duration, last_login]
+    """
+    by_user = {}
+    for record in iter_table_ranges(
+        supabase, "analytics", "user_id, duration, login_time", order="login_time"
+    ):
+        stats = by_user.setdefault(record["user_id"], [0, 0, None])
+        stats[0] += 1
+        stats[1] += record["duration"]
+        if stats[2] is None or record["login_time"] > stats[2]:
+            stats[2] = record["login_time"]
+    return by_user
 
-        for record in analytics_res.data:
-            uid = record["user_id"]
-            analytics_by_user.setdefault(uid, []).append(record)
 
-        result = []
+@app.route("/analytics/users", methods=["GET"])
+def analytics_users():
+    try:
+        results = run_queries({
+            "users": lambda: list(iter_table(
+                supabase, "users", "user_id, name, role, is_active", key="user_id"
+            )),
+            "analytics": analytics_by_user,
+        })
+    except QueryError as e:
+        app.logger.error("User analytics failed: %s", e)
+        return jsonify({"error": str(e), "failed_queries": e.failures}), 504 if e.timed_out else 500
 
-        for user in users_res.data:
-            uid = user["user_id"]
-            records = analytics_by_user.get(uid, [])
+    stats_by_user = results["analytics"]
+    result = []
 
-            login_count = len(records)
-            total_duration = sum(r["duration"] for r in records)
-            average_duration = (
-                round(total_duration / login_count, 2)
-                if login_count > 0 else 0
-            )
-            last_login = (
-                max(r["login_time"] for r in records)
-                if records else None
-            )
+    for user in results["users"]:
+        uid = user["user_id"]
+        login_count, total_duration, last_login = stats_by_user.get(uid, [0, 0, None])
 
-            result.append({
-                "user_id": uid,
-                "name": user["name"],
-                "role": user["role"],
-                "is_active": user["is_active"],
-                "login_count": login_count,
-                "total_duration": total_duration,
-                "average_duration": average_duration,
-                "last_login": last_login
-            })
+        average_duration = (
+            round(total_duration / login_count, 2)
+            if login_count > 0 else 0
+        )
 
-        return jsonify(result), 200
+        result.append({
+            "user_id": uid,
+            "name": user["name"],
+            "role": user["role"],
+            "is_active": user["is_active"],
+            "login_count": login_count,
+            "total_duration": total_duration,
+            "average_duration": average_duration,
+            "last_login": last_login
+        })
 
-    except Exception as e:
-        app.logger.exception("User analytics failed")
-        return jsonify({"error": str(e)}), 500
+    return jsonify(result), 200
 
 # User Management Endpoints
 @app.route("/api/users", methods=["POST"])
@@ -638,12 +853,14 @@ def create_user():
 
 @app.route("/api/users", methods=["GET"])
 def get_users():
-    res = supabase.table("users") \
-        .select("user_id, name, role, is_active, created_at") \
-        .order("user_id") \
-        .execute()
+    try:
+        users = list(iter_table(
+            supabase, "users", "user_id, name, role, is_active, created_at", key="user_id"
+        ))
+    except TableReadError as e:
+        return jsonify({"error": str(e)}), 500
 
-    return jsonify(res.data), 200
+    return jsonify(users), 200
 
 @app.route("/api/users/<int:user_id>", methods=["PUT"])
 def update_user(user_id):
@@ -683,22 +900,9 @@ def delete_user(user_id):
 
     return jsonify({"status": "deleted"}), 200
 
-def log_change(entity_type, entity_id, operation):
-    supabase.table("changelog").insert({
-        "entity_type": entity_type,
-        "entity_id": entity_id,
-        "operation": operation,
-        "version": get_next_version()
-    }).execute()
-
-def get_next_version():
-    res = supabase.table("changelog") \
-        .select("version") \
-        .order("version", desc=True) \
-        .limit(1) \
-        .execute()
-
-    return (res.data[0]["version"] + 1) if res.data else 1
+def log_change(entity_type, entity_id, operation, payload=None):
+    #shared buffered writer, flushed before returning (see changelog.py)
+    return changelog.log_change(supabase, entity_type, entity_id, operation, payload)
 
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
@@ -1,6 +1,10 @@
 # audit.py
+import numpy as np
 import pandas as pd
 
+from file_reader import iter_frames
+from near_duplicates import find_near_duplicates
+
 DB_COLS = [
     "scientific_name",
     "common_name",
@@ -36,77 +40,190 @@ def normalize(col: str) -> str:
 
 
 def read_file_to_df(file_path: str) -> pd.DataFrame:
-    """Reads CSV or XLSX"""
-    if file_path.lower().endswith(".csv"):
-        encodings = ["utf-8", "utf-8-sig", "latin-1", "cp1252"]
-        last_err = None
-        for enc in encodings:
-            try:
-                return pd.read_csv(file_path, dtype=str, encoding=enc).fillna("")
-            except Exception as e:
-                last_err = e
-        raise Exception(f"CSV file couldn't be read. Last error: {last_err}")
-    else:
-        return pd.read_excel(file_path, dtype=str).fillna("")
+    """
+    Reads CSV or XLSX, streamed in chunks.
+    Only the columns the audit looks at are kept, so a wide sheet
+    never sits in memory in full.
+    """
+    wanted = {normalize(c) for c in DB_COLS}
+    frames = []
+    for frame in iter_frames(file_path):
+        frames.append(frame[[c for c in frame.columns if normalize(c) in wanted]])
+    return pd.concat(frames, ignore_index=True)
+
+
+#rows per chunk for the streaming audit
+AUDIT_CHUNK_ROWS = 5000
+
+
+class AuditAccumulator:
+    """
+    audit state that grows chunk by chunk
+
+    every check keeps a small accumulator (counts, sets of bad values,
+    a running set of scientific names) so memory is one chunk plus the
+    distinct names. two accumulators over different parts of a file can
+    be merged, and report() works at any point for a partial report
+
+    name_index (a species_index.ScientificNameIndex) also checks every
+    name against the species already stored, one dict lookup per name
+
+    the final report also clusters near duplicate scientific and common
+    names (see near_duplicates), against the stored names too when there
+    is an index. partial reports skip it, it needs every name
+    """
+
+    def __init__(self, name_index=None):
+        self.name_index = name_index
+        self.existing_names = set()
+        self.columns = None
+        self.missing_required_cols = []
+        self.rows = 0
+        self.empty_rows = 0
+        self.missing_by_col = {c: 0 for c in DB_COLS}
+        self.seen_names = set()
+        self.common_names = set()
+        self.duplicate_names = set()
+        self.leaf_invalid = set()
+        self.fruit_invalid = set()
+
+    def add(self, df: pd.DataFrame):
+        """folds one chunk (columns as in the file) into the totals"""
+        # normalized column name mapping
+        normalized_cols = {normalize(c): c for c in df.columns}
+        if self.columns is None:
+            self.columns = list(df.columns)
+            self.missing_required_cols = [c for c in DB_COLS if normalize(c) not in normalized_cols]
+
+        # every column is stripped once, column wise, and reused by all checks
+        row_count = int(len(df))
+        clean = {}
+        for c in DB_COLS:
+            key = normalize(c)
+            if key in normalized_cols:
+                clean[c] = df[normalized_cols[key]].fillna("").astype(str).str.strip()
+
+        # blank masks, a missing column is blank everywhere
+        blank = {c: (clean[c] == "").to_numpy() for c in clean}
+
+        # counts of missing/empty
+        self.rows += row_count
+        for c in DB_COLS:
+            self.missing_by_col[c] += int(blank[c].sum()) if c in blank else row_count
+
+        if blank:
+            self.empty_rows += int(np.logical_and.reduce(list(blank.values())).sum())
+        else:
+            self.empty_rows += row_count
+
+        # duplicates: scientific_name, within the chunk and against earlier chunks
+        if "scientific_name" in clean:
+            sci = clean["scientific_name"][~blank["scientific_name"]]
+            self.duplicate_names.update(sci[sci.duplicated()].unique().tolist())
+            names = set(sci.unique().tolist())
+            self.duplicate_names.update(names & self.seen_names)
+            if self.name_index is not None:
+                self.existing_names.update(n for n in names - self.seen_names if n in self.name_index)
+            self.seen_names |= names
+
+        if "common_name" in clean:
+            self.common_names.update(clean["common_name"][~blank["common_name"]].unique().tolist())
+
+        # Controlled vocab checks, on the distinct values only
+        for col, allowed, invalid in (
+            ("leaf_type", LEAF_TYPES_ALLOWED, self.leaf_invalid),
+            ("fruit_type", FRUIT_TYPES_ALLOWED, self.fruit_invalid),
+        ):
+            if col in clean:
+                invalid.update(v for v in clean[col].unique() if v and v not in allowed)
+
+        return self
+
+    def merge(self, other: "AuditAccumulator"):
+        """folds in an accumulator built over another part of the file"""
+        if self.columns is None:
+            self.columns = other.columns
+            self.missing_required_cols = other.missing_required_cols
+        self.rows += other.rows
+        self.empty_rows += other.empty_rows
+        for c in DB_COLS:
+            self.missing_by_col[c] += other.missing_by_col[c]
+        self.duplicate_names |= other.duplicate_names | (self.seen_names & other.seen_names)
+        self.seen_names |= other.seen_names
+        self.common_names |= other.common_names
+        self.existing_names |= other.existing_names
+        self.leaf_invalid |= other.leaf_invalid
+        self.fruit_invalid |= other.fruit_invalid
+        return self
+
+    def report(self, partial: bool = False) -> dict:
+        duplicate_scientific_names = sorted(self.duplicate_names)
+        missing_by_col = dict(self.missing_by_col)
+        missing_required_cols = list(self.missing_required_cols)
+
+        # summary report
+        total_missing = int(sum(missing_by_col.values()))
+        has_blockers = (len(missing_required_cols) > 0)
+
+        report = {
+            "rows": self.rows,
+            "empty_rows": self.empty_rows,
+            "required_columns": DB_COLS,
+            "missing_required_columns": missing_required_cols,
+            "missing_values_by_column": missing_by_col,
+            "total_missing_values": total_missing,
+            "duplicate_scientific_names": duplicate_scientific_names,
+            "duplicates_count": len(duplicate_scientific_names),
+            "leaf_type_invalid_values": sorted(self.leaf_invalid),
+            "fruit_type_invalid_values": sorted(self.fruit_invalid),
+            "has_blockers": has_blockers,
+            "notes": [
+                "Fix the excel if missing_required_columns is not empty.",
+                "If leaf type or fruit type vocbulary error check",
+                " checking for scientific_name duplicates",
+            ],
+        }
+        if self.name_index is not None:
+            # names that would duplicate a species already in species_en
+            report["existing_scientific_names"] = sorted(self.existing_names)
+            report["existing_count"] = len(self.existing_names)
+        if partial:
+            report["partial"] = True
+        else:
+            # spelling variants, eg "Toona ciliata" / "Toona cilliata"
+            stored = self.name_index.names() if self.name_index is not None else ()
+            near_sci = find_near_duplicates(self.seen_names, stored)
+            near_common = find_near_duplicates(self.common_names, kind="common")
+            report["near_duplicate_scientific_names"] = near_sci
+            report["near_duplicate_common_names"] = near_common
+            report["near_duplicates_count"] = len(near_sci) + len(near_common)
+        return report
 
 
 def audit_dataframe(df: pd.DataFrame) -> dict:
-    # normalized column name mapping
-    normalized_cols = {normalize(c): c for c in df.columns}
-
-    missing_required_cols = [c for c in DB_COLS if normalize(c) not in normalized_cols]
-
-    # DF with DB_COLS
-    data = {}
-    for c in DB_COLS:
-        key = normalize(c)
-        if key in normalized_cols:
-            data[c] = df[normalized_cols[key]].astype(str).fillna("").map(lambda x: x.strip())
-        else:
-            data[c] = [""] * len(df)
-
-    clean = pd.DataFrame(data)
-
-    # counts of missing/empty
-    missing_by_col = {}
-    for c in DB_COLS:
-        missing_by_col[c] = int((clean[c].astype(str).str.strip() == "").sum())
-
-    # duplicates: scientific_name
-    sci = clean["scientific_name"].astype(str).str.strip()
-    dup_mask = sci.duplicated(keep=False) & (sci != "")
-    duplicate_scientific_names = sorted(set(sci[dup_mask].tolist()))
-
-    # Controlled vocab checks
-    leaf_vals = set(clean["leaf_type"].astype(str).str.strip())
-    fruit_vals = set(clean["fruit_type"].astype(str).str.strip())
-
-    leaf_invalid = sorted([v for v in leaf_vals if v and v not in LEAF_TYPES_ALLOWED])
-    fruit_invalid = sorted([v for v in fruit_vals if v and v not in FRUIT_TYPES_ALLOWED])
-
-
-    row_count = int(len(clean))
-    empty_rows = int((clean.astype(str).apply(lambda r: all(x.strip() == "" for x in r), axis=1)).sum())
-
-    # summary report
-    total_missing = int(sum(missing_by_col.values()))
-    has_blockers = (len(missing_required_cols) > 0)
-
-    return {
-        "rows": row_count,
-        "empty_rows": empty_rows,
-        "required_columns": DB_COLS,
-        "missing_required_columns": missing_required_cols,
-        "missing_values_by_column": missing_by_col,
-        "total_missing_values": total_missing,
-        "duplicate_scientific_names": duplicate_scientific_names,
-        "duplicates_count": len(duplicate_scientific_names),
-        "leaf_type_invalid_values": leaf_invalid,
-        "fruit_type_invalid_values": fruit_invalid,
-        "has_blockers": has_blockers,
-        "notes": [
-            "Fix the excel if missing_required_columns is not empty.",
-            "If leaf type or fruit type vocbulary error check",
-            " checking for scientific_name duplicates",
-        ],
-    }
+    return AuditAccumulator().add(df).report()
+
+
+def iter_audit_chunks(file_path: str, chunk_size: int = AUDIT_CHUNK_ROWS, name_index=None):
+    """
+    streams the file in chunks, keeping only the audited columns,
+    yields the accumulator after each chunk
+    """
+    wanted = {normalize(c) for c in DB_COLS}
+    acc = AuditAccumulator(name_index)
+    for frame in iter_frames(file_path, chunk_size):
+        acc.add(frame[[c for c in frame.columns if normalize(c) in wanted]])
+        yield acc
+
+
+def audit_file(file_path: str, chunk_size: int = AUDIT_CHUNK_ROWS, on_partial=None, name_index=None) -> dict:
+    """
+    audits a file chunk by chunk, memory is bounded by chunk_size plus
+    the distinct scientific names. on_partial(report) gets a partial
+    report after every chunk
+    """
+    acc = AuditAccumulator(name_index)
+    for acc in iter_audit_chunks(file_path, chunk_size, name_index):
+        if on_partial:
+            on_partial(acc.report(partial=True))
+    return acc.report()
@@ -0,0 +1,107 @@
+"""
+audit benchmark
+
+builds synthetic species sheets (10k, 100k and 1M rows by default) and
+times audit_dataframe on each (near duplicate clustering included), with
+peak memory from tracemalloc.
+--csv also writes each sheet to a temporary CSV and times
+read_file_to_df + audit, the path /audit-species takes
+
+    python benchmark_audit.py
+    python benchmark_audit.py --rows 10000 250000 --csv
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+from audit import (
+    DB_COLS,
+    LEAF_TYPES_ALLOWED,
+    FRUIT_TYPES_ALLOWED,
+    read_file_to_df,
+    audit_dataframe,
+)
+
+DEFAULT_ROWS = [10_000, 100_000, 1_000_000]
+
+
+def synthetic_sheet(rows, seed=0):
+    """
+    a sheet shaped like a field inventory: mostly valid rows with some
+    blanks, stray spaces, duplicate names and off vocabulary values
+    """
+    rng = random.Random(seed)
+    leaf = sorted(LEAF_TYPES_ALLOWED) + ["Simpel", " Simple "]
+    fruit = sorted(FRUIT_TYPES_ALLOWED) + ["Berry", ""]
+
+    #a few percent of names repeat
+    names = [f"Genus{i % 5000} species{i}" for i in range(rows)]
+    for i in rng.sample(range(rows), rows // 50):
+        names[i] = names[rng.randrange(rows)]
+
+    data = {}
+    for col in DB_COLS:
+        if col == "scientific_name":
+            data[col] = names
+        elif col == "leaf_type":
+            data[col] = [rng.choice(leaf) for _ in range(rows)]
+        elif col == "fruit_type":
+            data[col] = [rng.choice(fruit) for _ in range(rows)]
+        else:
+            words = [f"{col} text {n}" for n in range(200)] + ["", "  "]
+            data[col] = [rng.choice(words) for _ in range(rows)]
+    return pd.DataFrame(data)
+
+
+def measure(fn):
+    """(result, seconds, peak MB) for fn()"""
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        result = fn()
+        seconds = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return result, seconds, peak / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark audit_dataframe")
+    parser.add_argument("--rows", type=int, nargs="+", default=DEFAULT_ROWS)
+    parser.add_argument("--csv", action="store_true", help="also time reading a CSV file")
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'step':<14} {'seconds':>9} {'peak MB':>9}")
+    for rows in args.rows:
+        df = synthetic_sheet(rows)
+
+        report, seconds, peak = measure(lambda: audit_dataframe(df))
+        print(f"{rows:>10} {'audit':<14} {seconds:>9.2f} {peak:>9.1f}")
+
+        if args.csv:
+            fd, path = tempfile.mkstemp(suffix=".csv")
+            os.close(fd)
+            try:
+                df.to_csv(path, index=False)
+                _, seconds, peak = measure(lambda: audit_dataframe(read_file_to_df(path)))
+                print(f"{rows:>10} {'read + audit':<14} {seconds:>9.2f} {peak:>9.1f}")
+            finally:
+                os.remove(path)
+
+        print(
+            f"{'':>10} {report['duplicates_count']} duplicate names, "
+            f"{len(report['leaf_type_invalid_values'])} bad leaf types, "
+            f"{report['empty_rows']} empty rows, "
+            f"{report['near_duplicates_count']} near duplicate clusters"
+        )
+
+
+if __name__ == "__main__":
+    main()
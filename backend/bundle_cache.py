@@ -0,0 +1,209 @@
+"""
+snapshot cache for the /api/bundle payload
+
+the bundle only changes when the changelog version moves, so we build it
+once per version and keep the serialized bytes in memory, along with
+gzip and brotli copies compressed once at build time.
+optional on disk copy (BUNDLE_CACHE_DIR) so a restart doesnt start cold
+"""
+
+import gzip
+import json
+import os
+import threading
+
+try:
+    import brotli
+except ImportError:  #brotli is optional, gzip is always there
+    brotli = None
+
+#file suffix for each stored encoding
+ENCODING_SUFFIXES = {
+    "identity": ".json",
+    "gzip": ".json.gz",
+    "br": ".json.br",
+}
+
+#preferred order when client accepts several equally
+ENCODING_PREFERENCE = ["br", "gzip", "identity"]
+
+
+def bundle_etag(version, encoding="identity"):
+    """
+    strong etag for a bundle version (no W/ prefix)
+    each encoding gets its own tag since the bytes differ
+    """
+    if encoding == "identity":
+        return f"bundle-v{version}"
+    return f"bundle-v{version}-{encoding}"
+
+
+def compress_variants(body):
+    """raw bytes -> {encoding: bytes} for every encoding we can produce"""
+    variants = {
+        "identity": body,
+        #mtime=0 so the same bundle always compresses to the same bytes
+        "gzip": gzip.compress(body, compresslevel=9, mtime=0),
+    }
+    if brotli is not None:
+        variants["br"] = brotli.compress(body, quality=11)
+    return variants
+
+
+def choose_encoding(accept_encodings, available):
+    """
+    pick the encoding to send from werkzeug's request.accept_encodings
+    highest q wins, ties go to the smaller format
+    """
+    best, best_q = "identity", 0
+    for enc in ENCODING_PREFERENCE:
+        if enc not in available:
+            continue
+        q = accept_encodings.quality(enc)
+        #identity is acceptable unless explicitly refused
+        if enc == "identity" and q == 0 and "identity" not in accept_encodings:
+            q = 0.001
+        if q > best_q:
+            best, best_q = enc, q
+    return best
+
+
+def serialize_bundle(payload):
+    """compact utf-8 json, same bytes every time for the same payload"""
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def count_bundle_rows(payload):
+    """total rows across every table list in a bundle payload"""
+    return sum(len(v) for v in payload.values() if isinstance(v, list))
+
+
+class BundleCache:
+    """
+    holds the serialized bundle (all encodings) for the latest version only
+
+    older versions are never served again (clients always get the latest)
+    so there is no point keeping them around
+
+    the version is the only key: rows changed without a changelog entry
+    keep the old bundle (also across restarts with a disk copy) until the
+    version moves, see POST /api/bundle/invalidate
+    """
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir
+        self._version = None
+        self._variants = None
+        self._rows = None
+        #one lock for reads + builds so a burst of installs only builds once
+        self._lock = threading.Lock()
+
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _disk_path(self, version, encoding):
+        return os.path.join(self.cache_dir, f"bundle-v{version}{ENCODING_SUFFIXES[encoding]}")
+
+    def _meta_path(self, version):
+        return os.path.join(self.cache_dir, f"bundle-v{version}.meta")
+
+    def _load_from_disk(self, version):
+        """returns (variants, row count) or (None, None)"""
+        if not self.cache_dir:
+            return None, None
+        variants = {}
+        for encoding in ENCODING_SUFFIXES:
+            path = self._disk_path(version, encoding)
+            if not os.path.exists(path):
+                continue
+            try:
+                with open(path, "rb") as f:
+                    variants[encoding] = f.read()
+            except OSError:
+                return None, None
+
+        if "identity" not in variants:
+            return None, None
+
+        try:
+            with open(self._meta_path(version), "r") as f:
+                rows = json.load(f)["rows"]
+        except (OSError, ValueError, KeyError):
+            #older disk copy without meta, count it once
+            rows = count_bundle_rows(json.loads(variants["identity"]))
+
+        #brotli may have been installed since the disk copy was made
+        if brotli is not None and "br" not in variants:
+            variants = compress_variants(variants["identity"])
+            self._write_to_disk(version, variants, rows)
+        return variants, rows
+
+    def _write_to_disk(self, version, variants, rows):
+        if not self.cache_dir:
+            return
+        keep = set()
+        try:
+            with open(self._meta_path(version), "w") as f:
+                json.dump({"rows": rows}, f)
+            keep.add(os.path.basename(self._meta_path(version)))
+
+            #write then rename so a crash never leaves half a bundle behind
+            for encoding, body in variants.items():
+                path = self._disk_path(version, encoding)
+                tmp_path = path + ".tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(body)
+                os.replace(tmp_path, path)
+                keep.add(os.path.basename(path))
+
+            #clean out older versions
+            for name in os.listdir(self.cache_dir):
+                if name.startswith("bundle-v") and name not in keep:
+                    os.remove(os.path.join(self.cache_dir, name))
+        except OSError as e:
+            #disk copy is only a warm start helper, memory copy still works
+            print("Bundle cache disk write failed:", e)
+
+    def get(self, version):
+        """returns {encoding: bytes} for version or None"""
+        with self._lock:
+            if self._version == version:
+                return self._variants
+
+            variants, rows = self._load_from_disk(version)
+            if variants is not None:
+                self._version, self._variants, self._rows = version, variants, rows
+            return variants
+
+    def row_count(self, version):
+        """rows in the cached bundle for version, None if not cached"""
+        with self._lock:
+            return self._rows if self._version == version else None
+
+    def get_or_build(self, version, build):
+        """
+        returns {encoding: bytes} for version, calling build() -> payload
+        dict on a miss
+
+        build and compression run under the lock so concurrent misses for
+        the same version wait for the first one instead of all hitting supabase
+        """
+        with self._lock:
+            if self._version == version:
+                return self._variants
+
+            variants, rows = self._load_from_disk(version)
+            if variants is None:
+                payload = build()
+                rows = count_bundle_rows(payload)
+                variants = compress_variants(serialize_bundle(payload))
+                self._write_to_disk(version, variants, rows)
+
+            self._version, self._variants, self._rows = version, variants, rows
+            return variants
+
+    def invalidate(self):
+        with self._lock:
+            self._version = None
+            self._variants = None
+            self._rows = None
@@ -1,11 +1,166 @@
-def log_change(supabase, entity_type, entity_id, operation):
-    supabase.table("changelog").insert({
-        "entity_type": entity_type,
-        "entity_id": entity_id,
-        "operation": operation,
-        "version": get_next_version(supabase)
-    }).execute()
-    
+"""
+changelog writes
+
+every mutation goes through ChangelogWriter, which buffers entries and
+writes them with one append_changelog call (schema/changelog_versions.sql).
+that call reserves a block of versions for the whole batch, inserts it and
+updates the latest change index in a single round trip
+"""
+
+import atexit
+import os
+import threading
+
+from pagination import iter_table
+
+#entries per touch_changelog_latest call when folding history
+LATEST_BATCH = 500
+
+#buffered entries are flushed when this many are waiting...
+WRITER_MAX_BATCH = int(os.getenv("CHANGELOG_MAX_BATCH", "200"))
+#...or after this many seconds, whichever comes first
+WRITER_FLUSH_INTERVAL = float(os.getenv("CHANGELOG_FLUSH_INTERVAL", "2"))
+
+
+class ChangelogWriter:
+    """
+    buffers changelog entries and flushes them in bulk
+
+    log(..., sync=True) flushes straight away and returns the version,
+    for request paths that need the entry written (or an error) before
+    they respond. bulk jobs use sync=False and call flush() at the end
+    """
+
+    def __init__(self, supabase, max_batch=WRITER_MAX_BATCH, flush_interval=WRITER_FLUSH_INTERVAL):
+        self.supabase = supabase
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._timer = None
+
+    def log(self, entity_type, entity_id, operation, payload=None, sync=True):
+        """
+        queues one entry. returns its version when sync, else None
+        """
+        pending = {
+            "entry": {
+                "entity_type": entity_type,
+                "entity_id": entity_id,
+                "operation": operation,
+                "payload": payload,
+                "fields": latest_fields(operation, payload),
+            },
+            "version": None,
+            #the caller learns about a failed write and handles it, so a
+            #failed flush doesnt keep this entry for a retry
+            "sync": sync,
+        }
+        with self._lock:
+            self._buffer.append(pending)
+            full = len(self._buffer) >= self.max_batch
+
+        if sync:
+            #a flush running on another thread may already have written it,
+            #flushes are serialized so by the time ours returns it is done
+            self.flush()
+            if pending["version"] is None:
+                raise Exception("changelog entry was not written")
+            return pending["version"]
+
+        if full:
+            self.flush()
+        else:
+            self._schedule_flush()
+        return None
+
+    def flush(self):
+        """
+        writes everything buffered in one call
+        returns the number of entries written
+        """
+        #one flush at a time so batches land in the order they were logged
+        with self._flush_lock:
+            with self._lock:
+                batch, self._buffer = self._buffer, []
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+
+            if not batch:
+                return 0
+
+            try:
+                resp = self.supabase.rpc(
+                    "append_changelog",
+                    {"entries": [pending["entry"] for pending in batch]}
+                ).execute()
+            except Exception:
+                #put the buffered ones back so a later flush can retry.
+                #sync entries are dropped: their caller gets the error and
+                #may undo its change (eg /upload deletes the rows), a late
+                #retry would then log a change that never happened
+                retry = [pending for pending in batch if not pending["sync"]]
+                with self._lock:
+                    self._buffer[:0] = retry
+                raise
+
+            #versions in the block follow the order of the batch
+            for i, pending in enumerate(batch):
+                pending["version"] = resp.data + i
+            return len(batch)
+
+    def _schedule_flush(self):
+        with self._lock:
+            if self._timer is not None or not self._buffer:
+                return
+            self._timer = threading.Timer(self.flush_interval, self._background_flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _background_flush(self):
+        with self._lock:
+            self._timer = None
+        try:
+            self.flush()
+        except Exception as e:
+            print("Changelog background flush failed:", e)
+            self._schedule_flush()
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def get_writer(supabase):
+    """one shared writer per supabase client"""
+    with _writers_lock:
+        writer = _writers.get(id(supabase))
+        if writer is None:
+            writer = _writers[id(supabase)] = ChangelogWriter(supabase)
+        return writer
+
+
+@atexit.register
+def _flush_all():
+    for writer in list(_writers.values()):
+        try:
+            writer.flush()
+        except Exception as e:
+            print("Changelog flush at exit failed:", e)
+
+
+def log_change(supabase, entity_type, entity_id, operation, payload=None, sync=True):
+    """
+    payload is optional extra detail for sync, eg for an UPDATE
+        {"fields": {"media": {"alt_text": "new text"}}}
+    lets sync send just the changed fields instead of the whole row
+
+    sync=False buffers the entry (see ChangelogWriter)
+    """
+    return get_writer(supabase).log(entity_type, entity_id, operation, payload, sync=sync)
+
 def get_next_version(supabase):
     res = (
         supabase
@@ -16,3 +171,86 @@ def get_next_version(supabase):
         .execute()
     )
     return (res.data[0]["version"] + 1) if res.data else 1
+
+
+def latest_fields(operation, payload=None):
+    """
+    "<table>.<column>" for each field an UPDATE lists in its payload,
+    None when the change needs the whole row resent
+    """
+    changed = (payload or {}).get("fields")
+    if (operation or "").upper().startswith("UPDATE") and changed:
+        return [f"{table}.{col}" for table, cols in changed.items() for col in cols]
+    return None
+
+
+def latest_entry(entity_type, entity_id, version, operation, payload=None):
+    """
+    changelog entry -> entry for the changelog_latest index
+
+    updates that list their fields only bump those fields,
+    anything else means the whole row has to be resent
+    """
+    fields = latest_fields(operation, payload)
+    return {
+        "entity_type": entity_type,
+        "entity_id": entity_id,
+        "version": version,
+        "operation": operation,
+        "fields": {field: version for field in fields} if fields else None
+    }
+
+
+def touch_latest(supabase, entries):
+    """merge entries into changelog_latest in one round trip"""
+    if entries:
+        supabase.rpc("touch_changelog_latest", {"entries": entries}).execute()
+
+
+def fold_history(supabase, below_version=None):
+    """
+    folds changelog rows (all of them, or only those under below_version)
+    into the latest change index. safe to rerun, the index only moves forward.
+    history from before the index existed is folded by the migration
+    (schema/changelog_latest_table.sql), not here
+    """
+    where = None
+    if below_version is not None:
+        where = lambda q: q.lt("version", below_version)
+
+    folded = 0
+    batch = []
+    for row in iter_table(
+        supabase,
+        "changelog",
+        "change_id, version, entity_type, entity_id, operation, payload",
+        key="change_id",
+        where=where
+    ):
+        batch.append(latest_entry(
+            row["entity_type"], row["entity_id"], row["version"], row["operation"], row.get("payload")
+        ))
+        if len(batch) >= LATEST_BATCH:
+            touch_latest(supabase, batch)
+            folded += len(batch)
+            batch = []
+
+    touch_latest(supabase, batch)
+    folded += len(batch)
+    return folded
+
+
+def compact_changelog(supabase, retention_version):
+    """
+    drops changelog history below retention_version after folding it into
+    the latest change index, so sync still knows about every entity.
+    the newest entry is always kept since it carries the current version
+    """
+    latest = get_next_version(supabase) - 1
+    retention_version = min(retention_version, latest)
+
+    folded = fold_history(supabase, retention_version)
+    if folded:
+        supabase.table("changelog").delete().lt("version", retention_version).execute()
+
+    return {"retention_version": retention_version, "folded": folded}
@@ -0,0 +1,68 @@
+"""
+runs independent supabase reads in parallel
+
+one shared thread pool for the whole app, so a request that needs four
+unrelated selects waits for the slowest one instead of the sum of all four
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+#default seconds each query gets before we give up on it. also the
+#timeout of every single request on the supabase client (see app.py),
+#which is what bounds paginated walks run with timeout=None
+QUERY_TIMEOUT = float(os.getenv("QUERY_TIMEOUT", "20"))
+
+_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv("QUERY_POOL_SIZE", "8")),
+    thread_name_prefix="supabase-query"
+)
+
+
+class QueryError(Exception):
+    """
+    one or more queries in a fan out failed
+    failures is {query name: error message} for every one that failed
+    """
+
+    def __init__(self, failures):
+        self.failures = failures
+        details = "; ".join(f"{name}: {msg}" for name, msg in failures.items())
+        super().__init__(f"query failed ({details})")
+
+    @property
+    def timed_out(self):
+        return all(msg.startswith("timed out") for msg in self.failures.values())
+
+
+def run_queries(queries, timeout=QUERY_TIMEOUT):
+    """
+    queries is {name: fn()} where each fn does its own supabase call(s)
+    returns {name: result} once all are done
+
+    every query gets up to timeout seconds from when the batch starts.
+    timeout=None waits for every query: for walks over many pages (bundle
+    tables) where a deadline on the whole walk would fail big catalogues,
+    each page request is still bounded by the client's own timeout.
+    raises QueryError naming each query that raised or timed out
+    """
+    futures = {name: _pool.submit(fn) for name, fn in queries.items()}
+    deadline = None if timeout is None else time.monotonic() + timeout
+
+    results = {}
+    failures = {}
+    for name, future in futures.items():
+        remaining = None if deadline is None else max(0, deadline - time.monotonic())
+        try:
+            results[name] = future.result(timeout=remaining)
+        except FutureTimeout:
+            #cant interrupt a running http call, but drop it if it hasnt started
+            future.cancel()
+            failures[name] = f"timed out after {timeout}s"
+        except Exception as e:
+            failures[name] = str(e) or type(e).__name__
+
+    if failures:
+        raise QueryError(failures)
+    return results
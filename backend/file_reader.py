@@ -0,0 +1,190 @@
+"""
+streaming CSV / XLSX reader
+
+uploads and audits used to load the whole sheet into a DataFrame (and retry
+the whole CSV once per encoding). this reads one row at a time instead:
+the CSV encoding is picked once from a small byte sample and XLSX goes
+through openpyxl's read only mode, so memory stays flat no matter how many
+rows the sheet has
+
+a sheet can also be stored already parsed (write_parsed), gzipped json
+lines that SheetReader reads back without openpyxl or encoding detection
+"""
+
+import codecs
+import csv
+import gzip
+import json
+import os
+
+import pandas as pd
+from openpyxl import load_workbook
+
+#bytes looked at to pick the CSV encoding
+ENCODING_SAMPLE_BYTES = 64 * 1024
+#rows per DataFrame from iter_frames
+READ_CHUNK_ROWS = int(os.getenv("READ_CHUNK_ROWS", "5000"))
+
+#tried in order on the sample, latin-1 decodes anything so it goes last
+CSV_ENCODINGS = ["utf-8", "cp1252", "latin-1"]
+
+#files written by write_parsed
+PARSED_SUFFIX = ".rows.gz"
+PARSED_FORMAT = 1
+
+
+def normalize(col):
+    return str(col).strip().lower().replace(" ", "_")
+
+
+def detect_encoding(file_path, sample_size=ENCODING_SAMPLE_BYTES):
+    """picks the CSV encoding from the first sample_size bytes"""
+    with open(file_path, "rb") as f:
+        sample = f.read(sample_size)
+
+    if sample.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+
+    for enc in CSV_ENCODINGS:
+        try:
+            #incremental so a character cut off at the end of the sample is fine
+            codecs.getincrementaldecoder(enc)().decode(sample, final=False)
+            return enc
+        except UnicodeDecodeError:
+            continue
+    return "latin-1"
+
+
+def _cell(value):
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _header(values):
+    return [
+        f"Unnamed: {i}" if v is None or str(v).strip() == "" else str(v).strip()
+        for i, v in enumerate(values)
+    ]
+
+
+class SheetReader:
+    """
+    reads a CSV or XLSX file row by row
+
+        with SheetReader(path) as sheet:
+            sheet.columns          # header as written in the file
+            for row in sheet:      # {normalized column: str value}
+                ...
+
+    blank cells come back as "". fully blank rows at the end of a workbook
+    (openpyxl often reports a few) are dropped
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.encoding = None
+        self.meta = {}
+        self._file = None
+        self._workbook = None
+
+        if file_path.endswith(PARSED_SUFFIX):
+            self.encoding = "utf-8"
+            self._file = gzip.open(file_path, "rt", encoding="utf-8")
+            self.meta = json.loads(self._file.readline() or "{}")
+            if self.meta.get("format") != PARSED_FORMAT:
+                self.close()
+                raise ValueError(f"{file_path} is not a parsed sheet this version can read")
+            self._rows = (json.loads(line) for line in self._file)
+            self.columns = self.meta["columns"]
+            self.normalized_columns = [normalize(c) for c in self.columns]
+            return
+
+        if file_path.lower().endswith(".csv"):
+            self.encoding = detect_encoding(file_path)
+            #a stray bad byte past the sample shouldnt abort a 100k row upload
+            self._file = open(file_path, newline="", encoding=self.encoding, errors="replace")
+            self._rows = (row for row in csv.reader(self._file) if row)
+        else:
+            self._workbook = load_workbook(file_path, read_only=True, data_only=True)
+            sheet = self._workbook.worksheets[0]
+            self._rows = sheet.iter_rows(values_only=True)
+
+        self.columns = _header(next(self._rows, []))
+        self.normalized_columns = [normalize(c) for c in self.columns]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._workbook is not None:
+            self._workbook.close()
+            self._workbook = None
+
+    def iter_values(self):
+        """yields each data row as a list of str, one per column"""
+        width = len(self.columns)
+        pending_blank = 0
+        for raw in self._rows:
+            values = [_cell(v) for v in raw[:width]]
+            values += [""] * (width - len(values))
+
+            if not any(v.strip() for v in values):
+                #only kept if a non blank row follows
+                pending_blank += 1
+                continue
+            for _ in range(pending_blank):
+                yield [""] * width
+            pending_blank = 0
+            yield values
+
+    def __iter__(self):
+        cols = self.normalized_columns
+        for values in self.iter_values():
+            yield dict(zip(cols, values))
+
+
+def iter_frames(file_path, chunk_size=READ_CHUNK_ROWS):
+    """
+    DataFrames of at most chunk_size rows, every value a str,
+    columns as written in the file. always yields at least one
+    (possibly empty) frame so the columns are known
+    """
+    with SheetReader(file_path) as sheet:
+        chunk = []
+        yielded = False
+        for values in sheet.iter_values():
+            chunk.append(values)
+            if len(chunk) >= chunk_size:
+                yield pd.DataFrame(chunk, columns=sheet.columns, dtype=str)
+                yielded = True
+                chunk = []
+        if chunk or not yielded:
+            yield pd.DataFrame(chunk, columns=sheet.columns, dtype=str)
+
+
+def write_parsed(file_path, out_path, **meta):
+    """
+    stores the sheet at file_path as parsed rows in out_path (PARSED_SUFFIX):
+    a json header line with the columns and meta, then one json list of
+    str per row, exactly as iter_values yields them, so row numbers match
+    the original file. returns the number of rows
+    """
+    rows = 0
+    with SheetReader(file_path) as sheet:
+        #level 1: most of the size win for a fraction of the time
+        with gzip.open(out_path, "wt", encoding="utf-8", compresslevel=1) as out:
+            header = {"format": PARSED_FORMAT, "columns": sheet.columns, **meta}
+            out.write(json.dumps(header, ensure_ascii=False) + "\n")
+            for values in sheet.iter_values():
+                out.write(json.dumps(values, ensure_ascii=False, separators=(",", ":")) + "\n")
+                rows += 1
+    return rows
@@ -0,0 +1,126 @@
+"""
+glossary translation tier
+
+fixed vocabulary (leaf/fruit types, phenology terms, ...) gets its tetum
+from a local json file instead of the translator, so it is instant and
+always comes out the same. checked before the translation memory and
+the network. the file is versioned and admins can extend it, by editing it
+(picked up within a second) or through PUT /translate/glossary
+
+    {"version": 3, "target": "tet", "entries": {"Simple": "...", ...}}
+"""
+
+import json
+import os
+import threading
+import time
+
+from translation_cache import normalize_text
+
+GLOSSARY_PATH = os.getenv(
+    "GLOSSARY_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "glossary.json")
+)
+
+#seconds between checks for an edited file
+RELOAD_INTERVAL = 1.0
+
+
+class Glossary:
+
+    def __init__(self, path=GLOSSARY_PATH, target="tet"):
+        self.path = path
+        self.target = target
+        self.version = 0
+        self._exact = {}
+        self._normalized = {}
+        self._mtime = None
+        self._checked = 0
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.exact_hits = 0
+        self.normalized_hits = 0
+        self._load()
+
+    def _load(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            #no file yet, empty glossary
+            self._mtime = None
+            return
+        if mtime == self._mtime:
+            return
+
+        with open(self.path, encoding="utf-8") as f:
+            data = json.load(f)
+        entries = data.get("entries", {})
+        self.version = data.get("version", 0)
+        self.target = data.get("target", self.target)
+        self._exact = dict(entries)
+        self._normalized = {normalize_text(k): v for k, v in entries.items()}
+        self._mtime = mtime
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._checked >= RELOAD_INTERVAL:
+            self._checked = now
+            try:
+                self._load()
+            except (OSError, ValueError) as e:
+                #keep serving the last good version
+                print("Glossary reload failed:", e)
+
+    def lookup(self, text, count=True):
+        """
+        translation of text or None, exact match first then normalized
+        (case, unicode form and spacing ignored).
+        count=False leaves the coverage stats alone (for estimates)
+        """
+        with self._lock:
+            self._maybe_reload()
+            translated = self._exact.get(text)
+            normalized = False
+            if translated is None:
+                translated = self._normalized.get(normalize_text(text))
+                normalized = translated is not None
+
+            if count:
+                self.lookups += 1
+                if normalized:
+                    self.normalized_hits += 1
+                elif translated is not None:
+                    self.exact_hits += 1
+            return translated
+
+    def add(self, entries):
+        """
+        merges {source: translation} into the file and bumps its version
+        returns the new version
+        """
+        with self._lock:
+            self._maybe_reload()
+            merged = {**self._exact, **entries}
+            data = {"version": self.version + 1, "target": self.target, "entries": merged}
+
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2, sort_keys=True)
+            os.replace(tmp, self.path)
+
+            self._mtime = None
+            self._load()
+            return self.version
+
+    def stats(self):
+        with self._lock:
+            hits = self.exact_hits + self.normalized_hits
+            return {
+                "version": self.version,
+                "entries": len(self._exact),
+                "lookups": self.lookups,
+                "exact_hits": self.exact_hits,
+                "normalized_hits": self.normalized_hits,
+                #share of looked up texts the glossary answered
+                "coverage": round(hits / self.lookups, 3) if self.lookups else 0,
+            }
@@ -9,6 +9,7 @@ from flask import request, jsonify
 from datetime import datetime, timezone
 from changelog import log_change, get_next_version
 from auth_authz import register_auth_routes, require_role, get_admin_user
+from pagination import iter_table, TableReadError
 
 
 def register_media_routes(app, supabase):
@@ -117,9 +118,11 @@ def register_media_routes(app, supabase):
         if err:
             return jsonify({"error": err[0]}), err[1]
 
-        result = (
-            supabase.table("media")
-            .select("""
+        try:
+            result = list(iter_table(
+                supabase,
+                "media",
+                """
                 media_id,
                 species_id,
                 species_name,
@@ -127,12 +130,14 @@ def register_media_routes(app, supabase):
                 download_link,
                 streaming_link,
                 alt_text
-            """)
-            .order("media_id", desc=True)
-            .execute()
-        )
+                """,
+                key="media_id",
+                desc=True
+            ))
+        except TableReadError as e:
+            return jsonify({"error": str(e)}), 500
 
-        return jsonify(result.data), 200
+        return jsonify(result), 200
 
     ###### UPDATING EXISTING MEDIA ######
     @app.put("/upload-media/<int:media_id>")
@@ -184,8 +189,8 @@ def register_media_routes(app, supabase):
         
         supabase.table("media").update(update_data).eq("media_id", media_id).execute()
 
-        #logging uupdate
-        log_change(supabase, "media", media_id, "UPDATE")
+        #logging uupdate, with the changed fields so sync can send just those
+        log_change(supabase, "media", media_id, "UPDATE", {"fields": {"media": update_data}})
         return jsonify({"status": "updated"}), 200
     
     ########### DELETE MEDIA #############
@@ -0,0 +1,186 @@
+"""
+near duplicate names for the audit
+
+field sheets spell the same species several ways ("Tectona grandis" /
+"Tectona grandis L.", "Toona ciliata" / "Toona cilliata"). comparing every
+pair is O(n^2), so names are first put into blocks by cheap keys and only
+pairs that share a block are scored:
+- scientific names: authorities are dropped, then blocked on
+  genus + start of the epithet, genus + end of the epithet, and
+  epithet + start of the genus (so a typo in either word still meets)
+- common names: blocked on the first letters of each word
+pairs scoring at least the threshold are joined into clusters
+"""
+
+import difflib
+import re
+import unicodedata
+
+#lowest similarity reported, common names are short so one typo costs more
+NEAR_DUPLICATE_THRESHOLD = {"scientific": 0.9, "common": 0.85}
+#blocks bigger than this are too generic to say anything, skipped
+MAX_BLOCK = 300
+
+#words that start an infraspecific name, kept in the canonical form
+RANKS = {"subsp", "ssp", "var", "f", "forma", "cv"}
+
+_word = re.compile(r"[^\W\d_]+(?:-[^\W\d_]+)*\.?", re.UNICODE)
+
+
+def _fold(text):
+    """lowercase, accents off"""
+    text = unicodedata.normalize("NFKD", str(text))
+    return "".join(ch for ch in text if not unicodedata.combining(ch)).casefold()
+
+
+def canonical_scientific(name):
+    """
+    genus + epithet (+ rank + infraspecific name), authorities dropped
+        "Tectona grandis L.f." -> "tectona grandis"
+        "Ficus benjamina var. nuda (Miq.) Barrett" -> "ficus benjamina var nuda"
+    """
+    words = _word.findall(_fold(name))
+    if not words:
+        return ""
+    kept = [words[0].rstrip(".")]
+    i = 1
+    if i < len(words) and not words[i].endswith("."):
+        kept.append(words[i])
+        i += 1
+    while i + 1 < len(words):
+        rank = words[i].rstrip(".")
+        if rank in RANKS:
+            kept += [rank, words[i + 1].rstrip(".")]
+            i += 2
+        else:
+            i += 1
+    return " ".join(kept)
+
+
+def canonical_common(name):
+    return " ".join(w.rstrip(".") for w in _word.findall(_fold(name)))
+
+
+def scientific_keys(canonical):
+    words = canonical.split()
+    genus = words[0]
+    if len(words) == 1:
+        return [("genus", genus)]
+    epithet = words[1]
+    return [
+        ("ge", genus, epithet[:3]),
+        ("ge-", genus, epithet[-3:]),
+        ("eg", epithet, genus[:2]),
+    ]
+
+
+def common_keys(canonical):
+    return [("w", word[:3]) for word in set(canonical.split()) if len(word) >= 3]
+
+
+def similarity(a, b, threshold=0.0):
+    """0-1 ratio of a and b, cheap upper bounds first so most pairs never get a full diff"""
+    longer = max(len(a), len(b))
+    if not longer:
+        return 1.0
+    if 2 * min(len(a), len(b)) / (len(a) + len(b)) < threshold:
+        return 0.0
+    matcher = difflib.SequenceMatcher(None, a, b, autojunk=False)
+    if matcher.real_quick_ratio() < threshold or matcher.quick_ratio() < threshold:
+        return 0.0
+    return matcher.ratio()
+
+
+class _Clusters:
+    """union find over canonical names"""
+
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, x):
+        self.parent.setdefault(x, x)
+        while self.parent[x] != x:
+            self.parent[x] = self.parent[self.parent[x]]
+            x = self.parent[x]
+        return x
+
+    def union(self, a, b):
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            self.parent[rb] = ra
+
+
+def find_near_duplicates(names, existing=(), kind="scientific", threshold=None):
+    """
+    clusters of names (from the file) that are probably the same thing,
+    possibly together with names already stored (existing)
+
+    returns [{"names": [file names], "existing": [stored names],
+              "pairs": [{"a", "b", "score"}], "score": lowest pair score}]
+    exact duplicates arent repeated here, the audit reports those already
+    """
+    if threshold is None:
+        threshold = NEAR_DUPLICATE_THRESHOLD[kind]
+    canonical = canonical_scientific if kind == "scientific" else canonical_common
+    keys_of = scientific_keys if kind == "scientific" else common_keys
+
+    #canonical form -> the raw spellings behind it, per source
+    forms = {}
+    for source, values in (("file", names), ("existing", existing)):
+        for raw in values:
+            if not raw or not str(raw).strip():
+                continue
+            form = canonical(raw)
+            if form:
+                forms.setdefault(form, {"file": set(), "existing": set()})[source].add(str(raw).strip())
+
+    blocks = {}
+    for form in forms:
+        for key in keys_of(form):
+            blocks.setdefault(key, []).append(form)
+
+    clusters = _Clusters()
+    pairs = {}
+    for block in blocks.values():
+        if len(block) < 2 or len(block) > MAX_BLOCK:
+            continue
+        for i, a in enumerate(block):
+            for b in block[i + 1:]:
+                if (a, b) in pairs or (b, a) in pairs:
+                    continue
+                if not (forms[a]["file"] or forms[b]["file"]):
+                    continue
+                score = similarity(a, b, threshold)
+                if score >= threshold:
+                    pairs[(a, b)] = score
+                    clusters.union(a, b)
+
+    #spellings that only differ by authority / case / accents: same canonical form
+    for form, sources in forms.items():
+        if sources["file"] and len(sources["file"] | sources["existing"]) > 1:
+            clusters.find(form)
+
+    grouped = {}
+    for form in clusters.parent:
+        grouped.setdefault(clusters.find(form), []).append(form)
+
+    result = []
+    for members in grouped.values():
+        file_names = sorted(set().union(*(forms[f]["file"] for f in members)))
+        stored = sorted(set().union(*(forms[f]["existing"] for f in members)))
+        if len(file_names) + len(stored) < 2 or not file_names:
+            continue
+        member_set = set(members)
+        cluster_pairs = [
+            {"a": a, "b": b, "score": round(score, 3)}
+            for (a, b), score in pairs.items() if a in member_set
+        ]
+        result.append({
+            "names": file_names,
+            "existing": stored,
+            "pairs": cluster_pairs,
+            "score": min([p["score"] for p in cluster_pairs], default=1.0),
+        })
+
+    result.sort(key=lambda c: (c["score"], c["names"]))
+    return result
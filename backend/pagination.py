@@ -0,0 +1,82 @@
+"""
+paginated table reads
+
+a plain .select("*").execute() silently stops at PostgREST's max-rows
+setting, so anything that needs a whole table walks it here instead,
+one page at a time by primary key (keyset paging, not offsets)
+"""
+
+#keep at or below the max-rows setting on the supabase project
+PAGE_SIZE = 1000
+
+
+class TableReadError(Exception):
+    pass
+
+
+def iter_table(supabase, table, columns="*", key="id", page_size=PAGE_SIZE, desc=False, where=None):
+    """
+    yields every row of table, page_size rows per request
+
+    key must be unique and in columns (its the cursor)
+    where is an optional fn(query) -> query for extra filters, eg
+        where=lambda q: q.gt("version", 10)
+    """
+    last = None
+    while True:
+        query = (
+            supabase.table(table)
+            .select(columns)
+            .order(key, desc=desc)
+            .limit(page_size)
+        )
+        if where is not None:
+            query = where(query)
+        if last is not None:
+            query = query.lt(key, last) if desc else query.gt(key, last)
+
+        resp = query.execute()
+        if resp.data is None:
+            raise TableReadError(f"couldnt load {table}")
+
+        #stop on an empty page rather than a short one, the server may
+        #cap pages below page_size and a short page doesnt mean the end
+        if not resp.data:
+            return
+
+        yield from resp.data
+        last = resp.data[-1][key]
+
+
+def iter_table_ranges(supabase, table, columns="*", order=None, page_size=PAGE_SIZE, where=None):
+    """
+    offset paging for tables without a usable unique key (eg analytics)
+    order should still be given so pages dont shuffle between requests
+    """
+    start = 0
+    while True:
+        query = supabase.table(table).select(columns)
+        if order is not None:
+            query = query.order(order)
+        if where is not None:
+            query = where(query)
+
+        resp = query.range(start, start + page_size - 1).execute()
+        if resp.data is None:
+            raise TableReadError(f"couldnt load {table}")
+        if not resp.data:
+            return
+
+        yield from resp.data
+        start += len(resp.data)
+
+
+def count_rows(supabase, table, key="id"):
+    """exact row count without pulling the rows"""
+    resp = (
+        supabase.table(table)
+        .select(key, count="exact")
+        .limit(1)
+        .execute()
+    )
+    return resp.count or 0
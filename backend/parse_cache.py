@@ -0,0 +1,180 @@
+"""
+parsed sheet cache, shared by /audit-species, /plan-species and /upload-species
+
+the usual admin flow is audit, then upload the same file, and each step
+used to save its own temp copy and parse the sheet again. now an uploaded
+sheet is parsed once into file_reader's compact format (gzipped json rows)
+and stored under the sha256 of the uploaded bytes. that hash is the
+file_id the audit returns: /upload-species?file_id=... (or the same file
+uploaded again) starts from the parsed rows without reading the original.
+
+the cache directory is kept under PARSE_CACHE_BYTES, least recently used
+sheets go first (a hit touches the file's mtime, so the order survives a
+restart)
+"""
+
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import threading
+import uuid
+
+from file_reader import PARSED_SUFFIX, SheetReader, write_parsed
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+PARSE_CACHE_DIR = os.getenv("PARSE_CACHE_DIR", os.path.join(BACKEND_DIR, "parse_cache"))
+#size budget for the whole directory
+PARSE_CACHE_BYTES = int(os.getenv("PARSE_CACHE_BYTES", str(256 * 1024 * 1024)))
+
+_file_id = re.compile(r"^[0-9a-f]{64}$")
+
+
+def file_hash(file_path):
+    """sha256 of the file contents, identifies the same sheet uploaded again"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def upload_suffix(filename):
+    return ".xlsx" if filename.endswith(".xlsx") else ".csv"
+
+
+class ParseCache:
+
+    def __init__(self, directory=PARSE_CACHE_DIR, max_bytes=PARSE_CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, file_id):
+        """where file_id is (or would be) stored, ValueError for a malformed id"""
+        if not isinstance(file_id, str) or not _file_id.match(file_id):
+            raise ValueError("file_id must be the sha256 returned by /audit-species")
+        return os.path.join(self.directory, file_id + PARSED_SUFFIX)
+
+    def get(self, file_id):
+        """path of the parsed sheet, None if it isnt cached (or was evicted)"""
+        path = self.path(file_id)
+        try:
+            #mtime is the lru order
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            self.hits += 1
+        return path
+
+    def add(self, file_path, filename=None, content_hash=None):
+        """
+        parses file_path into the cache unless the same contents are there
+        already. returns (file_id, parsed path)
+        """
+        file_id = content_hash or file_hash(file_path)
+        path = self.get(file_id)
+        if path is not None:
+            return file_id, path
+
+        path = self.path(file_id)
+        #unique name so two requests parsing the same sheet dont collide
+        tmp = os.path.join(self.directory, f".{uuid.uuid4().hex}{PARSED_SUFFIX}.tmp")
+        try:
+            write_parsed(file_path, tmp, filename=filename, content_hash=file_id)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+        with self._lock:
+            self.misses += 1
+        self.evict(keep=path)
+        return file_id, path
+
+    def save_upload(self, uploaded_file):
+        """
+        werkzeug upload -> (file_id, parsed path). the original only lives
+        in a temp file for as long as it takes to parse it
+        """
+        fd, tmp = tempfile.mkstemp(suffix=upload_suffix(uploaded_file.filename), dir=self.directory)
+        os.close(fd)
+        try:
+            uploaded_file.save(tmp)
+            return self.add(tmp, uploaded_file.filename)
+        finally:
+            os.remove(tmp)
+
+    def link(self, file_id, dest):
+        """
+        gives dest its own name for a cached sheet (hard link, copy if the
+        filesystem cant), so evicting it from the cache doesnt pull it out
+        from under an upload job. False if file_id isnt cached
+        """
+        path = self.get(file_id)
+        if path is None:
+            return False
+        try:
+            os.link(path, dest)
+        except FileNotFoundError:
+            return False
+        except OSError:
+            shutil.copyfile(path, dest)
+        return True
+
+    def filename(self, path):
+        """name the sheet was uploaded as"""
+        with SheetReader(path) as sheet:
+            return sheet.meta.get("filename")
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(PARSED_SUFFIX) or name.startswith("."):
+                continue
+            try:
+                st = os.stat(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, name))
+        return entries
+
+    def evict(self, keep=None):
+        """drops least recently used sheets until the directory fits max_bytes"""
+        with self._lock:
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            for _, size, name in entries:
+                if total <= self.max_bytes:
+                    break
+                path = os.path.join(self.directory, name)
+                if path == keep:
+                    continue
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                self.evictions += 1
+
+    def stats(self):
+        entries = self._entries()
+        with self._lock:
+            return {
+                "files": len(entries),
+                "bytes": sum(size for _, size, _ in entries),
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+parse_cache = ParseCache()
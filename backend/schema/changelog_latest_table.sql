@@ -0,0 +1,90 @@
+-- latest change per entity, maintained on every log_change
+-- sync reads this instead of scanning changelog history
+CREATE TABLE changelog_latest (
+  entity_key TEXT PRIMARY KEY,           -- '<entity_type>:<entity_id>', '*' for entries without an id
+  entity_type TEXT NOT NULL,
+  entity_id INT,
+  version INT NOT NULL,                  -- last change of any kind
+  operation TEXT NOT NULL,               -- operation of that last change
+  full_version INT,                      -- last change that needs the whole row resent
+  field_versions JSONB NOT NULL DEFAULT '{}'  -- '<table>.<column>' -> last version that field changed
+);
+
+CREATE INDEX changelog_latest_version_idx ON changelog_latest (version);
+
+-- merges a batch of changelog entries into the index
+-- entries: [{entity_type, entity_id, version, operation, fields}] where fields
+-- is {'<table>.<column>': version} for field level updates or null for full row changes
+-- every column only moves forward so entries can arrive in any order (or twice)
+CREATE OR REPLACE FUNCTION touch_changelog_latest(entries JSONB)
+RETURNS void AS $$
+DECLARE
+  e JSONB;
+  k TEXT;
+  v INT;
+  cur changelog_latest%ROWTYPE;
+  merged JSONB;
+  full_v INT;
+  fk TEXT;
+  fv TEXT;
+BEGIN
+  FOR e IN SELECT * FROM jsonb_array_elements(entries) LOOP
+    k := (e->>'entity_type') || ':' || COALESCE(e->>'entity_id', '*');
+    v := (e->>'version')::INT;
+
+    INSERT INTO changelog_latest (entity_key, entity_type, entity_id, version, operation)
+    VALUES (k, e->>'entity_type', (e->>'entity_id')::INT, 0, '')
+    ON CONFLICT (entity_key) DO NOTHING;
+
+    SELECT * INTO cur FROM changelog_latest WHERE entity_key = k FOR UPDATE;
+
+    merged := cur.field_versions;
+    full_v := NULL;
+    IF jsonb_typeof(e->'fields') = 'object' THEN
+      FOR fk, fv IN SELECT * FROM jsonb_each_text(e->'fields') LOOP
+        IF COALESCE((merged->>fk)::INT, 0) < fv::INT THEN
+          merged := merged || jsonb_build_object(fk, fv::INT);
+        END IF;
+      END LOOP;
+    ELSE
+      full_v := v;
+    END IF;
+
+    UPDATE changelog_latest SET
+      version = GREATEST(cur.version, v),
+      operation = CASE WHEN v >= cur.version THEN e->>'operation' ELSE cur.operation END,
+      full_version = GREATEST(cur.full_version, full_v),
+      field_versions = merged
+    WHERE entity_key = k;
+  END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- backfill: folds the history written before this table existed, so a device
+-- that last synced before the migration still gets those changes from /api/sync.
+-- same entries log_change would have sent (see changelog.latest_entry): updates
+-- that list their fields only bump those fields, anything else is a full change.
+-- safe to rerun, touch_changelog_latest only moves forward
+SELECT touch_changelog_latest(COALESCE(jsonb_agg(jsonb_build_object(
+  'entity_type', c.entity_type,
+  'entity_id', c.entity_id,
+  'version', c.version,
+  'operation', c.operation,
+  'fields', CASE
+    WHEN upper(c.operation) LIKE 'UPDATE%'
+      AND jsonb_typeof(c.payload->'fields') = 'object' THEN (
+      SELECT jsonb_object_agg(t.key || '.' || f.col, c.version)
+      FROM jsonb_each(c.payload->'fields') AS t
+      CROSS JOIN LATERAL (
+        SELECT jsonb_object_keys(
+          CASE WHEN jsonb_typeof(t.value) = 'object' THEN t.value ELSE '{}' END
+        ) AS col
+        UNION ALL
+        SELECT jsonb_array_elements_text(
+          CASE WHEN jsonb_typeof(t.value) = 'array' THEN t.value ELSE '[]' END
+        )
+      ) AS f
+    )
+  END
+) ORDER BY c.version), '[]'))
+FROM changelog c;
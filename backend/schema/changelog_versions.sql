@@ -0,0 +1,63 @@
+-- single row counter for changelog versions
+-- replaces SELECT max(version) + 1, which raced between admins
+CREATE TABLE changelog_version_counter (
+  id INT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+  last_version INT NOT NULL
+);
+
+INSERT INTO changelog_version_counter (id, last_version)
+SELECT 1, COALESCE(MAX(version), 0) FROM changelog;
+
+-- reserves block_size consecutive versions, returns the first one
+-- the row lock is held until the calling transaction commits
+CREATE OR REPLACE FUNCTION reserve_versions(block_size INT)
+RETURNS INT AS $$
+  UPDATE changelog_version_counter
+  SET last_version = last_version + block_size
+  WHERE id = 1
+  RETURNING last_version - block_size + 1;
+$$ LANGUAGE sql;
+
+-- bulk changelog write: reserves one block of versions for the whole batch,
+-- inserts every entry and updates changelog_latest, all in one transaction.
+-- entries: [{entity_type, entity_id, operation, payload, fields}] where fields
+-- is a list of '<table>.<column>' for field level updates or null
+-- (see changelog_latest_table.sql). returns the first version of the block,
+-- entries get consecutive versions in array order.
+-- since the counter stays locked until commit, a later version is never
+-- visible before an earlier one, which sync's since_version relies on
+CREATE OR REPLACE FUNCTION append_changelog(entries JSONB)
+RETURNS INT AS $$
+DECLARE
+  first_version INT;
+BEGIN
+  first_version := reserve_versions(jsonb_array_length(entries));
+
+  INSERT INTO changelog (entity_type, entity_id, operation, payload, version)
+  SELECT
+    e->>'entity_type',
+    (e->>'entity_id')::INT,
+    e->>'operation',
+    e->'payload',
+    first_version + (i - 1)::INT
+  FROM jsonb_array_elements(entries) WITH ORDINALITY AS t(e, i);
+
+  PERFORM touch_changelog_latest((
+    SELECT jsonb_agg(jsonb_build_object(
+      'entity_type', e->>'entity_type',
+      'entity_id', e->'entity_id',
+      'version', first_version + (i - 1)::INT,
+      'operation', e->>'operation',
+      'fields', CASE
+        WHEN jsonb_typeof(e->'fields') = 'array' THEN (
+          SELECT jsonb_object_agg(f, first_version + (i - 1)::INT)
+          FROM jsonb_array_elements_text(e->'fields') AS f
+        )
+      END
+    ) ORDER BY i)
+    FROM jsonb_array_elements(entries) WITH ORDINALITY AS t(e, i)
+  ));
+
+  RETURN first_version;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,132 @@
+"""
+in memory index of the scientific names already in species_en
+
+lets the audit flag rows that duplicate a stored species without a query
+per row. loaded once with a paginated read, then kept current from the
+changelog: each refresh reads only the species changed since the version
+the index was built at (via changelog_latest) and refetches those rows
+"""
+
+import os
+import threading
+import time
+import unicodedata
+
+from changelog import get_next_version
+from pagination import iter_table
+from sync import read_changes, fetch_rows
+
+#seconds between changelog checks, audits in between use the index as is
+SPECIES_INDEX_REFRESH = float(os.getenv("SPECIES_INDEX_REFRESH", "5"))
+
+
+def normalize_name(name):
+    """same key for names that only differ by case, unicode form or spacing"""
+    return " ".join(unicodedata.normalize("NFC", str(name)).split()).casefold()
+
+
+class ScientificNameIndex:
+
+    def __init__(self, supabase, refresh_interval=SPECIES_INDEX_REFRESH):
+        self.supabase = supabase
+        self.refresh_interval = refresh_interval
+        #changelog version the index reflects, None until loaded
+        self.version = None
+        self._by_name = {}      #normalized name -> set of species_ids
+        self._by_id = {}        #species_id -> normalized name
+        self._names = {}        #normalized name -> name as stored
+        self._checked = 0
+        self._lock = threading.Lock()
+        self.full_loads = 0
+        self.incremental_refreshes = 0
+
+    def _add(self, species_id, name):
+        self._remove(species_id)
+        if not name or not name.strip():
+            return
+        key = normalize_name(name)
+        self._by_id[species_id] = key
+        self._by_name.setdefault(key, set()).add(species_id)
+        self._names.setdefault(key, name.strip())
+
+    def _remove(self, species_id):
+        key = self._by_id.pop(species_id, None)
+        if key is None:
+            return
+        ids = self._by_name.get(key)
+        if ids:
+            ids.discard(species_id)
+            if not ids:
+                del self._by_name[key]
+                self._names.pop(key, None)
+
+    def _load_all(self):
+        #version first, so anything changed during the scan is replayed next time
+        version = get_next_version(self.supabase) - 1
+        self._by_name = {}
+        self._by_id = {}
+        self._names = {}
+        for row in iter_table(self.supabase, "species_en", "species_id, scientific_name", key="species_id"):
+            self._add(row["species_id"], row["scientific_name"])
+        self.version = version
+        self.full_loads += 1
+
+    def _refresh_changes(self):
+        latest, changes, has_unknown = read_changes(self.supabase, self.version)
+        if has_unknown:
+            #eg a bulk insert without ids, the changed set isnt known
+            self._load_all()
+            return
+
+        refetch = []
+        for species_id, state in changes["species"].items():
+            if state["deleted"]:
+                self._remove(species_id)
+            elif state["full"] or "scientific_name" in state["fields"].get("species_en", []):
+                refetch.append(species_id)
+
+        found = set()
+        for row in fetch_rows(self.supabase, "species_en", "species_id", refetch):
+            self._add(row["species_id"], row["scientific_name"])
+            found.add(row["species_id"])
+        for species_id in set(refetch) - found:
+            self._remove(species_id)
+
+        self.version = latest
+        self.incremental_refreshes += 1
+
+    def refresh(self, force=False):
+        """
+        brings the index up to date, at most once per refresh_interval
+        unless forced. raises if the database cant be read
+        """
+        with self._lock:
+            now = time.monotonic()
+            if not force and self.version is not None and now - self._checked < self.refresh_interval:
+                return
+            if self.version is None:
+                self._load_all()
+            else:
+                self._refresh_changes()
+            self._checked = now
+
+    def lookup(self, name):
+        """species_ids stored under name (normalized), empty if none"""
+        ids = self._by_name.get(normalize_name(name))
+        return sorted(ids) if ids else []
+
+    def names(self):
+        """one spelling per stored name, for fuzzy matching"""
+        return list(self._names.values())
+
+    def __contains__(self, name):
+        return normalize_name(name) in self._by_name
+
+    def stats(self):
+        return {
+            "version": self.version,
+            "names": len(self._by_name),
+            "species": len(self._by_id),
+            "full_loads": self.full_loads,
+            "incremental_refreshes": self.incremental_refreshes,
+        }
@@ -0,0 +1,144 @@
+"""
+species edit endpoints for the dashboard
+
+the bundle cache and /api/sync only see writes that bump the changelog,
+so edits and deletes made from the dashboard go through here instead of
+straight to supabase, and each one is logged like every other write.
+species_tet shares species_id with species_en and follows every edit
+"""
+
+import os
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from flask import request, jsonify
+
+from auth_authz import get_admin_user
+from changelog import log_change
+from uploader import db_cols, translated_cols, translation_worker
+
+#same budget as /translate
+TRANSLATE_TIMEOUT = float(os.getenv("TRANSLATE_TIMEOUT", "60"))
+
+
+def _clean(value):
+    return "" if value is None else str(value)
+
+
+def tetum_fields(update_data):
+    """
+    species_en changes -> (species_tet changes, [stale columns])
+    the scientific name is copied, text is re-translated. a column the
+    translator couldnt do keeps its old tetum text and is listed as stale
+    """
+    tet_data = {col: value for col, value in update_data.items() if col not in translated_cols}
+    cols = [col for col in update_data if col in translated_cols]
+    if not cols:
+        return tet_data, []
+
+    texts = [_clean(update_data[col]) for col in cols]
+    try:
+        translated = translation_worker.translate_many(texts, timeout=TRANSLATE_TIMEOUT)
+    except FutureTimeout:
+        return tet_data, cols
+
+    stale = []
+    for col, text, result in zip(cols, texts, translated):
+        #translate_many gives "" back for text it couldnt translate
+        if text.strip() and not result:
+            stale.append(col)
+        else:
+            tet_data[col] = result
+    return tet_data, stale
+
+
+def register_species_routes(app, supabase):
+    """
+    attach the species edit routes to main flask app
+    """
+
+    ###### UPDATING AN EXISTING SPECIES ######
+    @app.put("/api/species/<int:species_id>")
+    def update_species(species_id):
+        """
+        admin only, updates species_en fields given in the json body
+        (any of the upload columns) and the matching species_tet fields,
+        re-translated. only fields that actually changed are written and
+        logged, so sync sends just those
+        """
+        admin_id, err = get_admin_user(supabase)
+        if err:
+            return jsonify({"error": err[0]}), err[1]
+
+        data = request.get_json(silent=True)
+        if not data:
+            return jsonify({"error": "missing JSON body"}), 400
+
+        unknown = sorted(set(data) - set(db_cols))
+        if unknown:
+            return jsonify({"error": f"unknown fields: {unknown}"}), 400
+
+        existing = (
+            supabase.table("species_en")
+            .select("*")
+            .eq("species_id", species_id)
+            .limit(1)
+            .execute()
+        )
+        if not existing.data:
+            return jsonify({"error": "species not found"}), 404
+
+        stored = existing.data[0]
+        update_data = {
+            col: value for col, value in data.items()
+            if _clean(value) != _clean(stored.get(col))
+        }
+        if not update_data:
+            return jsonify({"status": "unchanged"}), 200
+
+        tet_data, tet_stale = tetum_fields(update_data)
+        if tet_data:
+            supabase.table("species_tet").update(tet_data).eq("species_id", species_id).execute()
+        supabase.table("species_en").update(update_data).eq("species_id", species_id).execute()
+
+        #logging update, with the changed fields so sync can send just those.
+        #stale tetum columns still hold the text from before this edit
+        fields = {"species_en": update_data}
+        if tet_data:
+            fields["species_tet"] = tet_data
+        payload = {"fields": fields}
+        if tet_stale:
+            payload["tetum_stale"] = tet_stale
+        log_change(supabase, "species", species_id, "UPDATE", payload)
+        return jsonify({
+            "status": "updated",
+            "fields": sorted(update_data),
+            "tetum_stale": tet_stale
+        }), 200
+
+    ########### DELETE SPECIES #############
+    @app.delete("/api/species/<int:species_id>")
+    def delete_species(species_id):
+        """
+        admin only, deletes the species in both languages
+        """
+        admin_id, err = get_admin_user(supabase)
+        if err:
+            return jsonify({"error": err[0]}), err[1]
+
+        existing = (
+            supabase.table("species_en")
+            .select("species_id")
+            .eq("species_id", species_id)
+            .limit(1)
+            .execute()
+        )
+        if not existing.data:
+            return jsonify({"error": "species not found"}), 404
+
+        #tetum first so it never has a species english lacks
+        supabase.table("species_tet").delete().eq("species_id", species_id).execute()
+        supabase.table("species_en").delete().eq("species_id", species_id).execute()
+
+        #logging deletion for sync
+        log_change(supabase, "species", species_id, "DELETE")
+        return jsonify({"status": "deleted"}), 200
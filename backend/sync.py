@@ -0,0 +1,280 @@
+"""
+single round trip sync endpoint
+
+replaces calling /api/species/changes then /api/species/incremental.
+client sends the last version it synced and gets back one of:
+- up to date
+- the changes (delta): full rows for new species/media, field level
+  patches for edits and tombstones for deletes
+- force_bundle, when the delta would be about as big as the bundle itself
+"""
+
+from flask import request, jsonify
+
+from pagination import iter_table, TableReadError
+from concurrent_queries import run_queries, QueryError
+from changelog import compact_changelog
+from auth_authz import get_admin_user
+
+#force the bundle once the delta is estimated at this share of the bundle or more
+#(applying a big delta on the device is slower than swapping in a bundle)
+DELTA_BUNDLE_RATIO = 0.5
+
+#ids per .in_() request so urls stay under proxy length limits
+IN_CHUNK = 200
+
+#rough column count of a species/media row, for sizing field patches
+AVG_FIELDS_PER_ROW = 11
+
+
+#which table(s) each changelog entity_type lives in, and their key
+ENTITY_TABLES = {
+    "species": (["species_en", "species_tet"], "species_id"),
+    "media": (["media"], "media_id"),
+}
+
+
+def entity_state(row, since_version):
+    """
+    changelog_latest row -> what the client at since_version needs
+        {"deleted": bool, "full": bool, "fields": {table: [columns]}}
+    """
+    state = {"deleted": False, "full": False, "fields": {}}
+
+    if (row["operation"] or "").upper().startswith("DELETE"):
+        state["deleted"] = True
+    elif row["full_version"] is not None and row["full_version"] > since_version:
+        state["full"] = True
+    else:
+        for field, version in (row["field_versions"] or {}).items():
+            if version > since_version:
+                table, col = field.split(".", 1)
+                state["fields"].setdefault(table, []).append(col)
+
+    return state
+
+
+def read_changes(supabase, since_version):
+    """
+    reads the latest change index (changelog_latest) after since_version
+    so cost follows the number of changed entities, not changelog history
+
+    returns (latest_version, {entity_type: {id: state}}, has_unknown)
+    has_unknown is True when an entry has no entity_id (eg bulk inserts)
+    so the changed set cant be known from the log alone
+    """
+    latest_version = since_version
+    changes = {entity_type: {} for entity_type in ENTITY_TABLES}
+    has_unknown = False
+
+    for row in iter_table(
+        supabase,
+        "changelog_latest",
+        "entity_key, entity_type, entity_id, version, operation, full_version, field_versions",
+        key="entity_key",
+        where=lambda q: q.gt("version", since_version)
+    ):
+        latest_version = max(latest_version, row["version"])
+
+        if row["entity_type"] not in changes:
+            continue
+        if row["entity_id"] is None:
+            has_unknown = True
+            continue
+
+        changes[row["entity_type"]][row["entity_id"]] = entity_state(row, since_version)
+
+    return latest_version, changes, has_unknown
+
+
+def fetch_rows(supabase, table, key, ids):
+    """latest rows for ids, chunked so each request stays small"""
+    ids = sorted(ids)
+    rows = []
+    for i in range(0, len(ids), IN_CHUNK):
+        resp = (
+            supabase.table(table)
+            .select("*")
+            .in_(key, ids[i:i + IN_CHUNK])
+            .execute()
+        )
+        if resp.data is None:
+            raise TableReadError(f"couldnt load {table}")
+        rows.extend(resp.data)
+    return rows
+
+
+def split_changes(changes):
+    """
+    {entity_type: {id: state}} ->
+        fetch_ids  {entity_type: [ids whose rows we need, full or patched]}
+        tombstones {entity_type: [deleted ids]}
+    """
+    fetch_ids = {}
+    tombstones = {}
+
+    for entity_type, states in changes.items():
+        fetch_ids[entity_type] = []
+        tombstones[entity_type] = []
+
+        for entity_id, state in sorted(states.items()):
+            if state["deleted"]:
+                tombstones[entity_type].append(entity_id)
+                continue
+            fetch_ids[entity_type].append(entity_id)
+
+    return fetch_ids, tombstones
+
+
+def estimate_delta_bytes(changes, bundle_bytes, bundle_rows):
+    """
+    delta size from the average row (and field) size in the cached bundle
+    tombstones are just ids so they dont count
+    """
+    if not bundle_rows:
+        return 0
+    avg_row_bytes = bundle_bytes / bundle_rows
+
+    rows = 0.0
+    for entity_type, states in changes.items():
+        tables = ENTITY_TABLES[entity_type][0]
+        for state in states.values():
+            if state["full"]:
+                #species changes cost two rows (english + tetum)
+                rows += len(tables)
+            else:
+                rows += sum(len(cols) for cols in state["fields"].values()) / AVG_FIELDS_PER_ROW
+    return int(rows * avg_row_bytes)
+
+
+def build_delta(changes, fetched):
+    """
+    splits fetched rows into full rows and field patches
+    patches carry the current value of just the fields that changed
+    """
+    rows = {}
+    patches = {}
+
+    for entity_type, states in changes.items():
+        tables, key = ENTITY_TABLES[entity_type]
+        for table in tables:
+            rows[table] = []
+            patches[table] = []
+            for row in fetched.get(table, []):
+                state = states.get(row[key])
+                if state is None:
+                    continue
+                if state["full"]:
+                    rows[table].append(row)
+                elif table in state["fields"]:
+                    patches[table].append({
+                        key: row[key],
+                        "fields": {col: row.get(col) for col in state["fields"][table]}
+                    })
+
+    return rows, patches
+
+
+def register_sync_routes(app, supabase, load_bundle):
+    """
+    attach sync routes to main flask app
+
+    load_bundle(version) -> (variants, row count) from the bundle snapshot cache
+    """
+
+    @app.get("/api/sync")
+    def sync():
+        """
+        one call sync for the app
+
+        picks delta vs full bundle by estimated bytes, not by a fixed row count
+        """
+        since_version = request.args.get("since_version", type=int)
+        if since_version is None:
+            return jsonify({"error": "since_version required"}), 400
+
+        try:
+            latest_version, changes, has_unknown = read_changes(supabase, since_version)
+        except TableReadError as e:
+            return jsonify({"error": str(e)}), 500
+
+        #nothing after clients version, must be up to date
+        if latest_version == since_version:
+            return jsonify({
+                "up_to_date": True,
+                "force_bundle": False,
+                "latest_version": since_version
+            })
+
+        try:
+            variants, bundle_rows = load_bundle(latest_version)
+        except Exception as e:
+            return jsonify({"error": f"bundle unavailable: {e}"}), 500
+
+        bundle_bytes = len(variants["identity"])
+        delta_bytes = estimate_delta_bytes(changes, bundle_bytes, bundle_rows)
+
+        #bulk changes we cant list, or a delta close to the bundle size
+        if has_unknown or delta_bytes >= bundle_bytes * DELTA_BUNDLE_RATIO:
+            return jsonify({
+                "up_to_date": False,
+                "force_bundle": True,
+                "latest_version": latest_version,
+                "estimated_delta_bytes": delta_bytes,
+                "bundle_bytes": bundle_bytes
+            })
+
+        fetch_ids, tombstones = split_changes(changes)
+
+        queries = {}
+        for entity_type, ids in fetch_ids.items():
+            tables, key = ENTITY_TABLES[entity_type]
+            for table in tables:
+                queries[table] = (
+                    lambda table=table, key=key, ids=ids: fetch_rows(supabase, table, key, ids)
+                )
+
+        try:
+            #fetch_rows makes one request per IN_CHUNK ids, each bounded by
+            #the client timeout, so no deadline on the whole fetch
+            fetched = run_queries(queries, timeout=None)
+        except QueryError as e:
+            return jsonify({"error": str(e), "failed_queries": e.failures}), 500
+
+        rows, patches = build_delta(changes, fetched)
+
+        #full rows replace the local row, patches only overwrite the listed
+        #fields, deleted ids get removed from the device
+        return jsonify({
+            "up_to_date": False,
+            "force_bundle": False,
+            "latest_version": latest_version,
+            **rows,
+            "patches": patches,
+            "deleted": tombstones
+        })
+
+    @app.post("/api/changelog/compact")
+    def compact():
+        """
+        admin only maintenance job
+        folds changelog history below retention_version into the latest
+        change index and deletes it. /api/sync and the older
+        /api/species/changes and /api/species/incremental all read the
+        index, not the history, so every client still sees those changes
+        """
+        admin_id, err = get_admin_user(supabase)
+        if err:
+            return jsonify({"error": err[0]}), err[1]
+
+        data = request.get_json(silent=True) or {}
+        retention_version = data.get("retention_version")
+        if not isinstance(retention_version, int) or retention_version < 1:
+            return jsonify({"error": "retention_version (int >= 1) required"}), 400
+
+        try:
+            result = compact_changelog(supabase, retention_version)
+        except TableReadError as e:
+            return jsonify({"error": str(e)}), 500
+
+        return jsonify({"status": "compacted", **result}), 200
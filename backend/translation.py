@@ -0,0 +1,290 @@
+"""
+bounded concurrency translation engine
+
+runs many translations at once but never more than `concurrency` in flight,
+and never faster than the token bucket allows (the real upstream limit).
+failed calls are retried with backoff, without blocking the event loop
+"""
+
+import asyncio
+import os
+import random
+import threading
+import time
+
+TRANSLATE_CONCURRENCY = int(os.getenv("TRANSLATE_CONCURRENCY", "8"))
+#sustained requests per second to the translator, and how many can burst
+TRANSLATE_RATE = float(os.getenv("TRANSLATE_RATE", "5"))
+TRANSLATE_BURST = int(os.getenv("TRANSLATE_BURST", "5"))
+TRANSLATE_RETRIES = int(os.getenv("TRANSLATE_RETRIES", "3"))
+#first retry waits this long, doubling each time (plus jitter)
+TRANSLATE_BACKOFF = float(os.getenv("TRANSLATE_BACKOFF", "0.5"))
+
+
+class TranslationError(Exception):
+    pass
+
+
+class LatencyTracker:
+    """
+    running average (exponentially weighted) of how long calls take,
+    recent calls count the most. used to estimate upload times
+    """
+
+    def __init__(self, weight=0.2):
+        self.weight = weight
+        self.average = None
+        self.samples = 0
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            if self.average is None:
+                self.average = seconds
+            else:
+                self.average += self.weight * (seconds - self.average)
+            self.samples += 1
+
+    def get(self, default):
+        """average seconds, default until something has been measured"""
+        with self._lock:
+            return self.average if self.average is not None else default
+
+
+class AsyncTokenBucket:
+    """
+    rate limiter shared by every event loop in the process
+    (each request may run its own loop, the upstream limit is per process)
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _take(self):
+        """takes a token if there is one, else returns seconds to wait"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            return (1 - self._tokens) / self.rate
+
+    async def acquire(self):
+        while True:
+            wait = self._take()
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+
+class TranslationEngine:
+    """
+    wraps a single-call async translate fn(text) -> str
+
+    translate() checks the glossary and then the cache (if given) first,
+    then retries errors with backoff and raises TranslationError once it
+    runs out of attempts
+    """
+
+    def __init__(
+        self,
+        translate_fn,
+        cache=None,
+        target="tet",
+        glossary=None,
+        concurrency=TRANSLATE_CONCURRENCY,
+        rate=TRANSLATE_RATE,
+        burst=TRANSLATE_BURST,
+        retries=TRANSLATE_RETRIES,
+        backoff=TRANSLATE_BACKOFF,
+    ):
+        self.translate_fn = translate_fn
+        self.cache = cache
+        self.target = target
+        self.glossary = glossary
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.bucket = AsyncTokenBucket(rate, burst)
+        #upstream call time, excluding waits for the semaphore and bucket
+        self.latency = LatencyTracker()
+        #semaphores belong to one event loop, so keep one per loop
+        self._semaphores = {}
+        self._semaphores_lock = threading.Lock()
+
+    def _semaphore(self):
+        loop = asyncio.get_running_loop()
+        with self._semaphores_lock:
+            sem = self._semaphores.get(loop)
+            if sem is None:
+                #drop semaphores of loops that have since closed
+                self._semaphores = {l: s for l, s in self._semaphores.items() if not l.is_closed()}
+                sem = self._semaphores[loop] = asyncio.Semaphore(self.concurrency)
+            return sem
+
+    async def _call(self, text):
+        async with self._semaphore():
+            await self.bucket.acquire()
+            started = time.monotonic()
+            translated = await self.translate_fn(text)
+            self.latency.record(time.monotonic() - started)
+            return translated
+
+    def local(self, text):
+        """glossary or cached translation, None if it needs the network"""
+        if self.glossary is not None:
+            translated = self.glossary.lookup(text)
+            if translated is not None:
+                return translated
+        if self.cache is not None:
+            return self.cache.get(text, self.target)
+        return None
+
+    async def translate(self, text):
+        translated = self.local(text)
+        if translated is not None:
+            return translated
+        return await self.translate_remote(text)
+
+    async def translate_remote(self, text):
+        """network translation (stored in the cache), the local tiers are not checked"""
+        translated = await self._translate_uncached(text)
+
+        if self.cache is not None:
+            self.cache.put(text, self.target, translated)
+        return translated
+
+    async def _translate_uncached(self, text):
+        last_err = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                delay = self.backoff * (2 ** (attempt - 1))
+                await asyncio.sleep(delay + random.uniform(0, delay / 2))
+            try:
+                translated = await self._call(text)
+            except Exception as e:
+                last_err = e
+                continue
+
+            #translator sometimes echoes the input back, one more go at it
+            if translated.strip().lower() == text.strip().lower():
+                try:
+                    translated = await self._call(text)
+                except Exception:
+                    pass
+            return translated
+
+        raise TranslationError(f"{type(last_err).__name__}: {last_err}")
+
+    async def translate_fields(self, rows, fields, first_row=1):
+        """
+        translates fields of every row in place, all at once (within limits)
+
+        rows are dicts, first_row is the 1 based number of rows[0] for reporting.
+        a field that cant be translated is left "" and reported as
+        {"row": n, "field": name, "error": msg}
+
+        repeated text (same vocab in many rows) is only translated once
+        """
+        #text -> [(row index, field)] that need it
+        jobs = {}
+        for i, row in enumerate(rows):
+            for field in fields:
+                text = row.get(field)
+                if text and text.strip():
+                    jobs.setdefault(text, []).append((i, field))
+                else:
+                    row[field] = ""
+
+        texts = list(jobs)
+        results = await asyncio.gather(
+            *(self.translate(text) for text in texts),
+            return_exceptions=True
+        )
+
+        failures = []
+        for text, result in zip(texts, results):
+            for i, field in jobs[text]:
+                if isinstance(result, BaseException):
+                    rows[i][field] = ""
+                    failures.append({"row": first_row + i, "field": field, "error": str(result)})
+                else:
+                    rows[i][field] = result
+        failures.sort(key=lambda f: f["row"])
+        return failures
+
+
+class TranslationWorker:
+    """
+    one long lived event loop (on a daemon thread) that every request
+    hands its translations to, instead of each request spinning up its own
+    loop with asyncio.run. since all requests share the loop they also share
+    the engine's concurrency limit, so a burst of requests cant burst
+    the upstream translator
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self._loop = None
+        self._lock = threading.Lock()
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=loop.run_forever, name="translation-worker", daemon=True
+                ).start()
+                self._loop = loop
+            return self._loop
+
+    def translate_many(self, texts, timeout=None):
+        """
+        translates a list of strings, returns them in the same order.
+        repeated strings are translated once, glossary and cached ones never
+        leave the calling thread. a string that cant be translated comes back ""
+        """
+        results = {}
+        pending = []
+        for text in dict.fromkeys(texts):
+            if not isinstance(text, str) or not text.strip():
+                results[text] = ""
+                continue
+            local = self.engine.local(text)
+            if local is not None:
+                results[text] = local
+            else:
+                pending.append(text)
+
+        if pending:
+            future = asyncio.run_coroutine_threadsafe(
+                self._translate(pending), self._ensure_loop()
+            )
+            try:
+                results.update(future.result(timeout))
+            except Exception:
+                future.cancel()
+                raise
+
+        return [results[text] for text in texts]
+
+    async def _translate(self, texts):
+        translated = await asyncio.gather(
+            #already missed the glossary and cache in translate_many
+            *(self.engine.translate_remote(text) for text in texts),
+            return_exceptions=True
+        )
+        out = {}
+        for text, result in zip(texts, translated):
+            if isinstance(result, BaseException):
+                print("Translation failed:", result)
+                out[text] = ""
+            else:
+                out[text] = result
+        return out
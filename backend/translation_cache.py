@@ -0,0 +1,89 @@
+"""
+persistent translation memory
+
+species sheets repeat a lot of text (leaf/fruit types, habitat and pest
+phrases), so every translation is kept in a local sqlite file keyed by the
+normalized source text + target language. re-uploading a corrected sheet
+then needs almost no network translation
+"""
+
+import os
+import sqlite3
+import threading
+import unicodedata
+
+TRANSLATION_CACHE_PATH = os.getenv(
+    "TRANSLATION_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "translation_cache.sqlite3")
+)
+
+
+def normalize_text(text):
+    """same key for text that only differs by case, unicode form or spacing"""
+    return " ".join(unicodedata.normalize("NFC", text).split()).casefold()
+
+
+class TranslationCache:
+
+    def __init__(self, path=TRANSLATION_CACHE_PATH):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        #one connection shared by every thread, guarded by the lock
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS translations (
+                source_key TEXT NOT NULL,
+                target TEXT NOT NULL,
+                source TEXT NOT NULL,
+                translated TEXT NOT NULL,
+                PRIMARY KEY (source_key, target)
+            )
+        """)
+        self._conn.commit()
+
+    def get(self, text, target):
+        """cached translation or None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT translated FROM translations WHERE source_key = ? AND target = ?",
+                (normalize_text(text), target)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return row[0]
+
+    def peek(self, text, target):
+        """like get but doesnt count towards the hit rate (for estimates)"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM translations WHERE source_key = ? AND target = ?",
+                (normalize_text(text), target)
+            ).fetchone()
+            return row is not None
+
+    def put(self, text, target, translated):
+        if not translated:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO translations (source_key, target, source, translated) "
+                "VALUES (?, ?, ?, ?)",
+                (normalize_text(text), target, text, translated)
+            )
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "entries": entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0,
+            }
@@ -0,0 +1,642 @@
+"""
+background jobs for bulk species uploads
+
+/upload-species used to hold a flask worker for the whole
+read -> translate -> insert cycle. now it saves the file, queues a job and
+returns the job id straight away. a small in-process worker pool runs the
+jobs and keeps their status and progress in a local sqlite table, so
+clients poll for progress and the API workers stay free for bundle/sync
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from flask import request, jsonify
+
+from auth_authz import get_admin_user
+from changelog import log_change, get_writer
+from file_reader import PARSED_SUFFIX
+from parse_cache import parse_cache, file_hash, upload_suffix
+from uploader import process_file_dual, run_upload
+from upsert_import import process_file_upsert
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+UPLOAD_JOBS_PATH = os.getenv("UPLOAD_JOBS_PATH", os.path.join(BACKEND_DIR, "upload_jobs.sqlite3"))
+#uploaded files wait here until their job has run
+UPLOAD_FILES_DIR = os.getenv("UPLOAD_FILES_DIR", os.path.join(BACKEND_DIR, "upload_files"))
+#jobs running at once, each one already translates concurrently
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "2"))
+
+#status values
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+#was queued or running when the server stopped
+INTERRUPTED = "interrupted"
+
+FINISHED = {SUCCEEDED, FAILED, CANCELLED, INTERRUPTED}
+
+#insert: every row not already there is inserted (see uploader.process_file_dual)
+#upsert: rows are diffed against the stored species, only changes are written
+UPLOAD_MODES = ("insert", "upsert")
+
+EMPTY_PROGRESS = {
+    "start_row": 1,
+    "rows_parsed": 0,
+    "rows_translated": 0,
+    "en_rows_inserted": 0,
+    "tet_rows_inserted": 0,
+    "en_rows_skipped": 0,
+    "tet_rows_skipped": 0,
+    "rows_failed": 0,
+    "checkpoint_row": 0,
+}
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _process_alive(pid):
+    #our own pid at startup is a previous run (eg pid 1 in a restarted container)
+    if not pid or pid == os.getpid():
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        #exists, owned by someone else
+        return True
+    return True
+
+
+class JobStore:
+    """
+    upload_jobs table, one row per job, and upload_checkpoints:
+    per file content hash and upload mode, the last row such that every
+    row up to it is in both species tables (insert) or matches the file
+    in both tables (upsert). an insert checkpoint says nothing about
+    whether the stored rows match, so the modes dont share them
+    """
+
+    def __init__(self, path=UPLOAD_JOBS_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS upload_jobs (
+                job_id TEXT PRIMARY KEY,
+                filename TEXT NOT NULL,
+                file_path TEXT NOT NULL,
+                content_hash TEXT,
+                mode TEXT NOT NULL DEFAULT 'insert',
+                status TEXT NOT NULL,
+                progress TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                cancel_requested INTEGER NOT NULL DEFAULT 0,
+                runner_pid INTEGER,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            )
+        """)
+        #job tables created before these columns existed
+        cols = {row["name"] for row in self._conn.execute("PRAGMA table_info(upload_jobs)")}
+        if "content_hash" not in cols:
+            self._conn.execute("ALTER TABLE upload_jobs ADD COLUMN content_hash TEXT")
+        if "mode" not in cols:
+            self._conn.execute("ALTER TABLE upload_jobs ADD COLUMN mode TEXT NOT NULL DEFAULT 'insert'")
+        if "runner_pid" not in cols:
+            self._conn.execute("ALTER TABLE upload_jobs ADD COLUMN runner_pid INTEGER")
+        #checkpoints from before they were kept per mode cant be told apart,
+        #dropping them only means the next run checks those rows again
+        checkpoint_cols = {row["name"] for row in self._conn.execute("PRAGMA table_info(upload_checkpoints)")}
+        if checkpoint_cols and "mode" not in checkpoint_cols:
+            self._conn.execute("DROP TABLE upload_checkpoints")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS upload_checkpoints (
+                content_hash TEXT NOT NULL,
+                mode TEXT NOT NULL,
+                checkpoint_row INTEGER NOT NULL,
+                updated_at TEXT NOT NULL,
+                PRIMARY KEY (content_hash, mode)
+            )
+        """)
+        self._conn.commit()
+
+    def create(self, filename, file_path, content_hash, mode="insert", job_id=None):
+        job_id = job_id or uuid.uuid4().hex
+        now = _now()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO upload_jobs "
+                "(job_id, filename, file_path, content_hash, mode, status, progress, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, filename, file_path, content_hash, mode, QUEUED,
+                 json.dumps(EMPTY_PROGRESS), now, now)
+            )
+            self._conn.commit()
+        return job_id
+
+    def update(self, job_id, **fields):
+        """sets columns, progress/result are stored as json"""
+        for name in ("progress", "result"):
+            if name in fields:
+                fields[name] = json.dumps(fields[name])
+        fields["updated_at"] = _now()
+        cols = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE upload_jobs SET {cols} WHERE job_id = ?",
+                (*fields.values(), job_id)
+            )
+            self._conn.commit()
+
+    def claim(self, job_id):
+        """
+        queued -> running for this process, atomically. False if the job
+        isnt queued any more (another process or thread got it first)
+        """
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE upload_jobs SET status = ?, runner_pid = ?, updated_at = ? "
+                "WHERE job_id = ? AND status = ?",
+                (RUNNING, os.getpid(), _now(), job_id, QUEUED)
+            )
+            self._conn.commit()
+        return cur.rowcount == 1
+
+    def requeue(self, job_id, runner_pid):
+        """
+        running -> queued, only if runner_pid still owns it
+        (so two processes recovering at once requeue it once)
+        """
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE upload_jobs SET status = ?, updated_at = ? "
+                "WHERE job_id = ? AND status = ? AND runner_pid IS ?",
+                (QUEUED, _now(), job_id, RUNNING, runner_pid)
+            )
+            self._conn.commit()
+        return cur.rowcount == 1
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM upload_jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        return self._to_dict(row) if row else None
+
+    def recent(self, limit=20):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM upload_jobs ORDER BY created_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def active_with_hash(self, content_hash):
+        """a queued or running job for the same file contents, or None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM upload_jobs WHERE content_hash = ? AND status IN (?, ?) LIMIT 1",
+                (content_hash, QUEUED, RUNNING)
+            ).fetchone()
+        return self._to_dict(row) if row else None
+
+    def checkpoint(self, content_hash, mode):
+        """last row known to be done in this mode, 0 if none"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT checkpoint_row FROM upload_checkpoints WHERE content_hash = ? AND mode = ?",
+                (content_hash, mode)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def set_checkpoint(self, content_hash, mode, checkpoint_row):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO upload_checkpoints (content_hash, mode, checkpoint_row, updated_at) "
+                "VALUES (?, ?, ?, ?)",
+                (content_hash, mode, checkpoint_row, _now())
+            )
+            self._conn.commit()
+
+    def clear_checkpoint(self, content_hash, mode):
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM upload_checkpoints WHERE content_hash = ? AND mode = ?",
+                (content_hash, mode)
+            )
+            self._conn.commit()
+
+    def unfinished(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM upload_jobs WHERE status IN (?, ?) ORDER BY created_at",
+                (QUEUED, RUNNING)
+            ).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    @staticmethod
+    def _to_dict(row):
+        job = dict(row)
+        job["progress"] = json.loads(job["progress"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        job["cancel_requested"] = bool(job["cancel_requested"])
+        return job
+
+
+class JobRunner:
+    """
+    runs upload jobs on a thread pool, each in its own event loop
+
+    cancelling a queued job drops it, cancelling a running one stops it
+    between chunks (rows already written stay written).
+    jobs resume after the checkpoint of their file and skip species already
+    written, so retrying a job (or uploading the same sheet again) only costs
+    the rows that are still missing. the file is kept until a job succeeds
+    """
+
+    def __init__(self, supabase, store, workers=UPLOAD_WORKERS, recover=True):
+        self.supabase = supabase
+        self.store = store
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="upload-job")
+        self._cancel = {}
+        self._lock = threading.Lock()
+        if recover:
+            self._recover()
+
+    def _recover(self):
+        """
+        jobs a previous process never finished. uploads are idempotent
+        so even the ones that were mid run are picked up again.
+        a job still running in another live process (multi worker server)
+        is left alone, and every process may submit the queued ones:
+        claim() lets exactly one of them run each job
+        """
+        for job in self.store.unfinished():
+            if job["status"] == RUNNING and _process_alive(job["runner_pid"]):
+                continue
+            if not os.path.exists(job["file_path"]):
+                self.store.update(
+                    job["job_id"],
+                    status=INTERRUPTED,
+                    error="server stopped and the uploaded file is gone"
+                )
+                continue
+            if job["status"] == RUNNING and not self.store.requeue(job["job_id"], job["runner_pid"]):
+                continue
+            self.submit(job["job_id"])
+
+    def submit(self, job_id):
+        with self._lock:
+            self._cancel[job_id] = threading.Event()
+        self._pool.submit(self._run, job_id)
+
+    def resume(self, job_id):
+        """
+        requeues a failed, cancelled or interrupted job
+        returns (job, error message)
+        """
+        job = self.store.get(job_id)
+        if job is None:
+            return None, "job not found"
+        if job["status"] not in (FAILED, CANCELLED, INTERRUPTED):
+            return job, f"job is {job['status']}"
+        if not os.path.exists(job["file_path"]):
+            return job, "uploaded file is gone, upload it again"
+        if self.store.active_with_hash(job["content_hash"]):
+            return job, "another job is already uploading this file"
+
+        self.store.update(job_id, status=QUEUED, cancel_requested=0, error=None)
+        self.submit(job_id)
+        return self.store.get(job_id), None
+
+    def cancel(self, job_id):
+        """
+        asks a job to stop, returns the job (None if unknown)
+        """
+        job = self.store.get(job_id)
+        if job is None or job["status"] in FINISHED:
+            return job
+
+        self.store.update(job_id, cancel_requested=1)
+        with self._lock:
+            event = self._cancel.get(job_id)
+        if event is not None:
+            event.set()
+        return self.store.get(job_id)
+
+    def _run(self, job_id):
+        with self._lock:
+            event = self._cancel.get(job_id)
+
+        status = None
+        try:
+            if not self.store.claim(job_id):
+                #another process (or an earlier submit) has it
+                return
+            status = FAILED
+            job = self.store.get(job_id)
+            if job["cancel_requested"] or event.is_set():
+                status = CANCELLED
+                self.store.update(job_id, status=CANCELLED)
+                return
+
+            status = self._upload(job, event)
+        except Exception as e:
+            if status is not None:
+                self.store.update(job_id, status=FAILED, error=str(e))
+        finally:
+            with self._lock:
+                self._cancel.pop(job_id, None)
+            #anything short of success keeps the file so the job can resume
+            if status == SUCCEEDED:
+                try:
+                    os.remove(job["file_path"])
+                except OSError:
+                    pass
+
+    def _cancel_requested(self, job_id):
+        """cancel asked through another process (multi worker server)"""
+        job = self.store.get(job_id)
+        return bool(job and job["cancel_requested"])
+
+    def _upload(self, job, event):
+        """runs the upload, returns the final status"""
+        job_id = job["job_id"]
+        content_hash = job["content_hash"]
+
+        def on_progress(progress):
+            self.store.update(job_id, progress=progress)
+
+        def on_checkpoint(checkpoint_row):
+            self.store.set_checkpoint(content_hash, job["mode"], checkpoint_row)
+
+        kwargs = {
+            "on_progress": on_progress,
+            "should_stop": lambda: event.is_set() or self._cancel_requested(job_id),
+            "start_row": self.store.checkpoint(content_hash, job["mode"]) + 1,
+            "on_checkpoint": on_checkpoint,
+        }
+        upsert = job["mode"] == "upsert"
+        if upsert:
+            #one buffered entry per changed species, written in bulk
+            def on_change(species_id, operation, payload):
+                log_change(self.supabase, "species", species_id, operation, payload, sync=False)
+
+            try:
+                result = run_upload(process_file_upsert(job["file_path"], on_change=on_change, **kwargs))
+            finally:
+                get_writer(self.supabase).flush()
+        else:
+            result = run_upload(process_file_dual(job["file_path"], **kwargs))
+        en_result = result["species_en"]
+        tet_result = result["species_tet"]
+
+        #either table: a resumed job can have inserted only the tetum rows
+        #its first run missed, that still changes the bundle
+        rows_inserted = max(
+            en_result["rows_inserted"],
+            tet_result["rows_inserted"]
+        )
+
+        if rows_inserted and not upsert:
+            log_change(
+                self.supabase,
+                "species",
+                None,
+                f"BULK_INSERT ({rows_inserted} rows)"
+            )
+
+        failed_chunks = {
+            "species_en": en_result["failed_chunks"],
+            "species_tet": tet_result["failed_chunks"]
+        }
+        summary = {
+            "mode": job["mode"],
+            "rows_inserted": rows_inserted,
+            "failed_chunks": failed_chunks,
+            #fields that couldnt be translated, their species_tet rows were
+            #left out (a retry of the file translates them again)
+            "translation_failures": tet_result["translation_failures"]
+        }
+        if upsert:
+            summary["rows_updated"] = {
+                "species_en": en_result["rows_updated"],
+                "species_tet": tet_result["rows_updated"]
+            }
+            summary["species_changed"] = result["progress"]["species_changed"]
+        else:
+            summary["rows_skipped"] = {
+                "species_en": en_result["rows_skipped"],
+                "species_tet": tet_result["rows_skipped"]
+            }
+
+        if result["stopped"]:
+            status, error = CANCELLED, None
+        elif any(failed_chunks.values()):
+            status = FAILED
+            error = "Some rows failed to upload: " + "; ".join(
+                f"{table} rows {f['rows']}"
+                for table, failures in failed_chunks.items()
+                for f in failures
+            )
+        else:
+            status, error = SUCCEEDED, None
+            #whole file is in, a later upload of it checks every row again
+            self.store.clear_checkpoint(content_hash, job["mode"])
+
+        self.store.update(
+            job_id,
+            status=status,
+            error=error,
+            progress=result["progress"],
+            result=summary
+        )
+        return status
+
+
+def job_response(job):
+    """public view of a job"""
+    return {
+        "job_id": job["job_id"],
+        "filename": job["filename"],
+        "content_hash": job["content_hash"],
+        "mode": job["mode"],
+        "status": job["status"],
+        "progress": job["progress"],
+        "result": job["result"],
+        "error": job["error"],
+        "cancel_requested": job["cancel_requested"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+    }
+
+
+def register_upload_job_routes(app, supabase, recover=True):
+    """
+    attach /upload-species and the job status routes to the flask app
+    recover=False leaves unfinished jobs for another process to pick up
+    """
+    os.makedirs(UPLOAD_FILES_DIR, exist_ok=True)
+    store = JobStore()
+    runner = JobRunner(supabase, store, recover=recover)
+
+    """
+    This endpoint accepts an Excel or CSV file upload
+    and queues a job that populates the species_en and species_tet tables.
+    There is a species.xlsx sample file within the backend folder for testing.
+    Or you can also run > curl -X POST http://127.0.0.1:5000/upload-species -F "file=@species.xlsx"
+    then poll GET /upload-jobs/<job_id>
+    ?mode=upsert (or a "mode" form field) only writes species that changed
+    ?file_id= (or form field) instead of the file uploads a sheet /audit-species
+    already parsed, see parse_cache
+    """
+    @app.route("/upload-species", methods=["POST"])
+    def upload_species_file():
+        """
+        this is an admin only endpoint
+        for uploading species data
+        returns 202 with the job id, the upload runs in the background
+        """
+        #checking peermissions
+        # admin_id, err = get_admin_user(supabase)
+        # if err:
+        #     return jsonify({"error": err[0]}), err[1]
+
+        #a file_id from /audit-species stands in for the file, its rows are already parsed
+        file_id = request.args.get("file_id") or request.form.get("file_id")
+        if not file_id and "file" not in request.files:
+            return jsonify({"error": "No file part"}), 400
+
+        uploaded_file = request.files.get("file") if not file_id else None
+
+        if uploaded_file is not None and uploaded_file.filename == "":
+            return jsonify({"error": "No selected file"}), 400
+
+        mode = request.args.get("mode") or request.form.get("mode") or "insert"
+        if mode not in UPLOAD_MODES:
+            return jsonify({"error": f"mode must be one of {list(UPLOAD_MODES)}"}), 400
+
+        file_path = None
+        try:
+            job_id = uuid.uuid4().hex
+            if file_id:
+                try:
+                    parse_cache.path(file_id)
+                except ValueError as e:
+                    return jsonify({"error": str(e)}), 400
+                file_path = os.path.join(UPLOAD_FILES_DIR, job_id + PARSED_SUFFIX)
+                if not parse_cache.link(file_id, file_path):
+                    return jsonify({"error": "unknown or expired file_id, upload the file again"}), 404
+                content_hash = file_id
+                filename = parse_cache.filename(file_path) or file_id
+            else:
+                filename = uploaded_file.filename
+                file_path = os.path.join(UPLOAD_FILES_DIR, job_id + upload_suffix(filename))
+                uploaded_file.save(file_path)
+                content_hash = file_hash(file_path)
+                #audited already: run from the parsed rows, the original isnt needed
+                parsed_path = os.path.join(UPLOAD_FILES_DIR, job_id + PARSED_SUFFIX)
+                if parse_cache.link(content_hash, parsed_path):
+                    os.remove(file_path)
+                    file_path = parsed_path
+
+            #two jobs writing the same sheet at once could both miss a row
+            #the other is inserting, so only one runs at a time
+            active = store.active_with_hash(content_hash)
+            if active:
+                return jsonify({
+                    "error": "this file is already being uploaded",
+                    "job_id": active["job_id"],
+                    "status_url": f"/upload-jobs/{active['job_id']}"
+                }), 409
+
+            store.create(filename, file_path, content_hash, mode, job_id=job_id)
+            file_path = None
+            runner.submit(job_id)
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+        finally:
+            #only a queued job keeps its file
+            if file_path and os.path.exists(file_path):
+                os.remove(file_path)
+
+        return jsonify({
+            "status": QUEUED,
+            "job_id": job_id,
+            "status_url": f"/upload-jobs/{job_id}"
+        }), 202
+
+    @app.get("/upload-jobs")
+    def list_upload_jobs():
+        """most recent jobs first, ?limit= (default 20)"""
+        limit = request.args.get("limit", default=20, type=int)
+        return jsonify({"jobs": [job_response(job) for job in store.recent(limit)]}), 200
+
+    @app.get("/upload-jobs/<job_id>")
+    def get_upload_job(job_id):
+        job = store.get(job_id)
+        if job is None:
+            return jsonify({"error": "job not found"}), 404
+        return jsonify(job_response(job)), 200
+
+    @app.get("/upload-jobs/<job_id>/progress")
+    def get_upload_job_progress(job_id):
+        """just the counters, cheap enough to poll every second"""
+        job = store.get(job_id)
+        if job is None:
+            return jsonify({"error": "job not found"}), 404
+        return jsonify({
+            "job_id": job_id,
+            "status": job["status"],
+            "progress": job["progress"]
+        }), 200
+
+    @app.post("/upload-jobs/<job_id>/resume")
+    def resume_upload_job(job_id):
+        """
+        admin only, reruns a failed/cancelled/interrupted job from its
+        checkpoint, rows already in both tables are not written again
+        """
+        admin_id, err = get_admin_user(supabase)
+        if err:
+            return jsonify({"error": err[0]}), err[1]
+
+        job, error = runner.resume(job_id)
+        if job is None:
+            return jsonify({"error": error}), 404
+        if error:
+            return jsonify({"error": error, **job_response(job)}), 409
+        return jsonify(job_response(job)), 202
+
+    @app.post("/upload-jobs/<job_id>/cancel")
+    def cancel_upload_job(job_id):
+        """
+        admin only, stops the job between chunks
+        rows already inserted are kept
+        """
+        admin_id, err = get_admin_user(supabase)
+        if err:
+            return jsonify({"error": err[0]}), err[1]
+
+        job = runner.cancel(job_id)
+        if job is None:
+            return jsonify({"error": "job not found"}), 404
+        if job["status"] in FINISHED:
+            return jsonify({"error": f"job already {job['status']}", **job_response(job)}), 409
+        return jsonify(job_response(job)), 202
+
+    return runner
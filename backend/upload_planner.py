@@ -0,0 +1,180 @@
+"""
+dry run cost planner for /upload-species
+
+parses the file and looks up what is already stored, without writing or
+translating anything, then predicts what the real upload would cost:
+rows to insert / update / skip, translator calls left after the
+translation memory, REST requests and the expected wall time from the
+latencies measured on recent uploads
+"""
+
+from translation_cache import normalize_text
+from uploader import (
+    UPLOAD_CHUNK_SIZE,
+    translated_cols,
+    translation_engine,
+    translation_cache,
+    glossary,
+    request_latency,
+    table_target,
+    fetch_existing,
+    read_upload_rows,
+    iter_chunks,
+)
+from upsert_import import SELECT_COLS, diff_fields
+
+#used until an upload has measured the real values
+DEFAULT_TRANSLATE_SECONDS = 0.5
+DEFAULT_REQUEST_SECONDS = 0.3
+
+
+def estimate_seconds(plan, mode):
+    """
+    expected wall time of an upload from its plan
+    translator time is bound by the rate limit or by latency / concurrency,
+    whichever is slower. in insert mode english and tetum run side by side,
+    upsert mode handles both tables chunk by chunk
+    """
+    engine = translation_engine
+    translate_latency = engine.latency.get(DEFAULT_TRANSLATE_SECONDS)
+    request_seconds = request_latency.get(DEFAULT_REQUEST_SECONDS)
+
+    calls = plan["translation"]["calls"]
+    translate_seconds = max(
+        calls / engine.bucket.rate,
+        calls * translate_latency / engine.concurrency,
+    )
+    en_seconds = plan["requests"]["species_en"] * request_seconds
+    tet_seconds = plan["requests"]["species_tet"] * request_seconds
+
+    if mode == "upsert":
+        total = en_seconds + tet_seconds + translate_seconds
+    else:
+        total = max(en_seconds, tet_seconds + translate_seconds)
+
+    return {
+        "total_seconds": round(total, 1),
+        "translation_seconds": round(translate_seconds, 1),
+        "request_seconds": round(en_seconds + tet_seconds, 1),
+        "based_on": {
+            "translate_call_seconds": round(translate_latency, 3),
+            "translate_rate_per_second": engine.bucket.rate,
+            "translate_concurrency": engine.concurrency,
+            "request_seconds": round(request_seconds, 3),
+            #False means the defaults above, nothing measured yet
+            "measured": bool(engine.latency.samples and request_latency.samples),
+        },
+    }
+
+
+def plan_upload(file_path, mode="insert", chunk_size=UPLOAD_CHUNK_SIZE):
+    """
+    what uploading file_path in mode ("insert" or "upsert") would do
+    only reads: one lookup per table per chunk
+    """
+    en_endpoint, en_headers = table_target("species_en")
+    tet_endpoint, tet_headers = table_target("species_tet")
+    columns = SELECT_COLS if mode == "upsert" else "scientific_name"
+
+    counts = {
+        table: {"insert": 0, "update": 0, "skip": 0}
+        for table in ("species_en", "species_tet")
+    }
+    #write requests per table, lookups are added below
+    writes = {"species_en": 0, "species_tet": 0}
+    rows = 0
+    duplicates = 0
+    chunks = 0
+    seen = set()
+    #normalized text -> "glossary", "cached" or None (needs the translator),
+    #the same text is only translated once
+    texts = {}
+
+    def need_translation(text):
+        if text and text.strip():
+            key = normalize_text(text)
+            if key not in texts:
+                if glossary.lookup(text, count=False) is not None:
+                    texts[key] = "glossary"
+                elif translation_cache.peek(text, translation_engine.target):
+                    texts[key] = "cached"
+                else:
+                    texts[key] = None
+
+    for first_row, chunk in iter_chunks(read_upload_rows(file_path), chunk_size):
+        chunks += 1
+        rows += len(chunk)
+        names = sorted({row["scientific_name"].strip() for row in chunk if row["scientific_name"].strip()})
+
+        en_existing, tet_existing = {}, {}
+        if names:
+            en_existing, error = fetch_existing(en_endpoint, en_headers, names, columns)
+            if error is None:
+                tet_existing, error = fetch_existing(tet_endpoint, tet_headers, names, columns)
+            if error is not None:
+                raise Exception(f"couldnt look up existing species: {error}")
+
+        batch = {table: {"insert": 0, "update": 0} for table in counts}
+        for row in chunk:
+            name = row["scientific_name"].strip()
+            if name and name in seen:
+                duplicates += 1
+                continue
+            if name:
+                seen.add(name)
+
+            stored_en = en_existing.get(name) if name else None
+            stored_tet = tet_existing.get(name) if name else None
+            changed = diff_fields(stored_en, row) if mode == "upsert" and stored_en else []
+
+            if stored_en is None:
+                batch["species_en"]["insert"] += 1
+            elif changed:
+                batch["species_en"]["update"] += 1
+            else:
+                counts["species_en"]["skip"] += 1
+
+            if stored_tet is None:
+                batch["species_tet"]["insert"] += 1
+                for col in translated_cols:
+                    need_translation(row[col])
+            elif changed:
+                batch["species_tet"]["update"] += 1
+                for col in changed:
+                    if col in translated_cols:
+                        need_translation(row[col])
+            else:
+                counts["species_tet"]["skip"] += 1
+
+        for table, planned in batch.items():
+            for kind, n in planned.items():
+                counts[table][kind] += n
+                #one bulk request per non empty batch
+                writes[table] += 1 if n else 0
+
+    local = {"glossary": 0, "cached": 0}
+    for source in texts.values():
+        if source:
+            local[source] += 1
+    lookups = chunks if rows else 0
+    plan = {
+        "mode": mode,
+        "rows": rows,
+        "duplicate_rows": duplicates,
+        "species_en": counts["species_en"],
+        "species_tet": counts["species_tet"],
+        "translation": {
+            "unique_texts": len(texts),
+            "glossary": local["glossary"],
+            "cached": local["cached"],
+            "calls": len(texts) - local["glossary"] - local["cached"],
+        },
+        "requests": {
+            "chunk_size": chunk_size,
+            "chunks": chunks,
+            "species_en": lookups + writes["species_en"],
+            "species_tet": lookups + writes["species_tet"],
+        },
+    }
+    plan["estimate"] = estimate_seconds(plan, mode)
+    return plan
@@ -1,10 +1,16 @@
 import os
-import pandas as pd
 import requests
 import json
 from googletrans import Translator
 from dotenv import load_dotenv
+import asyncio
+import collections
+import threading
 import time
+from translation import TranslationEngine, TranslationWorker, LatencyTracker
+from translation_cache import TranslationCache
+from glossary import Glossary
+from file_reader import SheetReader
 
 load_dotenv()
 
@@ -24,96 +30,403 @@ db_cols = [
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
-translator = Translator()
+#rows per insert request
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", "100"))
 
-async def translate_to_tetum(text):
-    if not text or text.strip() == "":
-        return ""
-    try:
-        result = await translator.translate(text, dest="tet")
-        translated = result.text
+#googletrans keeps one httpx.AsyncClient, whose pooled connections belong
+#to the event loop that opened them. every upload job runs its own loop and
+#/translate runs on the worker loop, so each loop gets its own Translator
+#(same idea as the engine's per loop semaphores)
+_translators = {}
+_translators_lock = threading.Lock()
+
+
+def loop_translator():
+    """the Translator for the running event loop"""
+    global _translators
+    loop = asyncio.get_running_loop()
+    with _translators_lock:
+        translator = _translators.get(loop)
+        if translator is None:
+            #drop translators of loops that have since closed
+            _translators = {l: t for l, t in _translators.items() if not l.is_closed()}
+            translator = _translators[loop] = Translator()
+        return translator
+
+
+async def close_loop_translator():
+    """closes the running loop's Translator, call before the loop ends"""
+    with _translators_lock:
+        translator = _translators.pop(asyncio.get_running_loop(), None)
+    client = getattr(translator, "client", None)
+    if client is not None:
+        try:
+            await client.aclose()
+        except Exception as e:
+            print("Closing translator client failed:", e)
+
+
+def run_upload(coro):
+    """asyncio.run for an upload, closes the loop's Translator before the loop goes"""
+    async def main():
+        try:
+            return await coro
+        finally:
+            await close_loop_translator()
+    return asyncio.run(main())
+
+#one keep-alive session for every insert so rows dont each pay for a new
+#connection + TLS handshake
+http = requests.Session()
+http.mount("https://", requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=8))
+http.mount("http://", requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=8))
+
+#time per REST request (lookups and inserts), for upload estimates
+request_latency = LatencyTracker()
 
-        if translated.strip().lower() == text.strip().lower():
-            retry_result = await translator.translate(text, dest="tet")
-            return retry_result.text
+def timed_request(method, *args, **kwargs):
+    """http.get/http.post that records how long the request took"""
+    started = time.monotonic()
+    response = method(*args, **kwargs)
+    request_latency.record(time.monotonic() - started)
+    return response
 
-        return translated
+async def _googletrans(text):
+    result = await loop_translator().translate(text, dest="tet")
+    return result.text
 
-    except Exception as e:
-        print("Translation failed:", e)
-        return ""
+#shared by every upload and /translate so they all respect one rate limit
+#and share one translation memory
+translation_cache = TranslationCache()
+#fixed vocabulary, answered before the cache and the network
+glossary = Glossary()
+translation_engine = TranslationEngine(
+    _googletrans, cache=translation_cache, target="tet", glossary=glossary
+)
+#long lived loop for /translate, see TranslationWorker
+translation_worker = TranslationWorker(translation_engine)
 
+#fields sent to the translator (scientific names stay as they are)
+translated_cols = [col for col in db_cols if col != "scientific_name"]
 
 def normalize(col):
     return col.strip().lower().replace(" ", "_")
 
-async def process_file(file_path: str, translate: bool = True):
+def insert_chunk(endpoint, headers, rows, first_row, last_row=None):
     """
-    Process Excel/CSV file and upload translated or raw values.
-    translate=True -> Tetum table
-    translate=False -> English table
+    one bulk insert for a chunk of rows
+    returns None on success or a failure dict with the row range (1 based)
     """
-    if file_path.lower().endswith(".csv"):
-        encodings = ["utf-8", "latin-1", "cp1252"]
-        for enc in encodings:
-            try:
-                df = pd.read_csv(file_path, dtype=str, encoding=enc).fillna("")
-                break
-            except:
+    if last_row is None:
+        last_row = first_row + len(rows) - 1
+    try:
+        response = timed_request(http.post, endpoint, headers=headers, data=json.dumps(rows))
+    except requests.RequestException as e:
+        return {"rows": f"{first_row}-{last_row}", "error": str(e)}
+
+    if response.status_code >= 300:
+        return {"rows": f"{first_row}-{last_row}", "error": response.text}
+    return None
+
+
+def fetch_existing(endpoint, headers, names, columns="scientific_name"):
+    """
+    rows of the table whose scientific_name is in names,
+    scientific_name is the idempotency key for uploads
+    returns ({scientific_name: row}, None) or (None, error)
+    """
+    #postgrest in.() list, quoted so commas and brackets in names are safe
+    quoted = ",".join(
+        '"' + name.replace("\\", "\\\\").replace('"', '\\"') + '"' for name in names
+    )
+    try:
+        response = timed_request(
+            http.get,
+            endpoint,
+            headers=headers,
+            params={"select": columns, "scientific_name": f"in.({quoted})"}
+        )
+    except requests.RequestException as e:
+        return None, str(e)
+
+    if response.status_code >= 300:
+        return None, response.text
+    return {row["scientific_name"]: row for row in response.json()}, None
+
+
+def existing_names(endpoint, headers, names):
+    """
+    which of names the table already has
+    returns (set of names, None) or (None, error)
+    """
+    rows, error = fetch_existing(endpoint, headers, names)
+    return (set(rows) if rows is not None else None), error
+
+
+def table_target(table):
+    """rest endpoint + headers for inserting into table"""
+    endpoint = f"{SUPABASE_URL.rstrip('/')}/rest/v1/{table}"
+    headers = {
+        "apikey": SUPABASE_KEY,
+        "Authorization": f"Bearer {SUPABASE_KEY}",
+        "Content-Type": "application/json",
+        "Prefer": "return=minimal"
+    }
+    return endpoint, headers
+
+
+def read_upload_rows(file_path):
+    """
+    streams the Excel/CSV file as row dicts keyed by db_cols,
+    one row in memory at a time
+    raises if a required column is missing
+    """
+    with SheetReader(file_path) as sheet:
+        present = set(sheet.normalized_columns)
+        missing_cols = [col for col in db_cols if normalize(col) not in present]
+        if missing_cols:
+            raise Exception(
+                f"❌ Missing required columns in uploaded file: {missing_cols}. "
+                f"Please check the column names and try again."
+            )
+
+        for row in sheet:
+            yield {col: row.get(normalize(col), "") for col in db_cols}
+
+
+def iter_chunks(rows, chunk_size, start_row=1):
+    """
+    yields (first row number (1 based), chunk of rows)
+    rows before start_row are read but dropped (resuming from a checkpoint)
+    """
+    chunk = []
+    chunk_start = start_row
+    for number, row in enumerate(rows, 1):
+        if number < start_row:
+            continue
+        if not chunk:
+            chunk_start = number
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk_start, chunk
+            chunk = []
+    if chunk:
+        yield chunk_start, chunk
+
+
+class TableWriter:
+    """
+    inserts chunks into one species table, translating first for tetum.
+    rows whose scientific_name the table already has are skipped, so a
+    retried upload never writes a species twice.
+    keeps the counts and failures for that table
+    """
+
+    def __init__(self, table, translate):
+        self.table = table
+        self.translate = translate
+        self.endpoint, self.headers = table_target(table)
+        self.rows_translated = 0
+        self.rows_inserted = 0
+        self.rows_skipped = 0
+        self.rows_failed = 0
+        self.failed_chunks = []
+        self.translation_failures = []
+
+    async def new_rows(self, rows, first_row, last_row):
+        """
+        drops rows already in the table (or earlier in the chunk)
+        returns (rows, their file row numbers), (None, None) if the lookup failed
+        """
+        for row in rows:
+            row["scientific_name"] = row["scientific_name"].strip()
+
+        names = {row["scientific_name"] for row in rows if row["scientific_name"]}
+        existing = set()
+        if names:
+            existing, error = await asyncio.to_thread(
+                existing_names, self.endpoint, self.headers, sorted(names)
+            )
+            if error is not None:
+                #inserting blind could duplicate rows, so the chunk fails instead
+                self.failed_chunks.append({"rows": f"{first_row}-{last_row}", "error": error})
+                self.rows_failed += len(rows)
+                return None, None
+
+        kept, numbers = [], []
+        for number, row in enumerate(rows, first_row):
+            name = row["scientific_name"]
+            if name and name in existing:
+                self.rows_skipped += 1
                 continue
-    else:
-        df = pd.read_excel(file_path, dtype=str).fillna("")
-    
-    if (translate):
-        endpoint = f"{SUPABASE_URL.rstrip('/')}/rest/v1/species_tet"
-        headers = {
-            "apikey": SUPABASE_KEY,
-            "Authorization": f"Bearer {SUPABASE_KEY}",
-            "Content-Type": "application/json",
-            "Prefer": "return=minimal"
-        }
-    else:
-        endpoint = f"{SUPABASE_URL.rstrip('/')}/rest/v1/species_en"
-        headers = {
-            "apikey": SUPABASE_KEY,
-            "Authorization": f"Bearer {SUPABASE_KEY}",
-            "Content-Type": "application/json",
-            "Prefer": "return=minimal"
-        }
+            if name:
+                existing.add(name)
+            kept.append(row)
+            numbers.append(number)
+        return kept, numbers
+
+    async def write(self, rows, first_row):
+        """
+        returns True once every row of the chunk is in the table
+        (inserted now or already there). tetum rows that couldnt be fully
+        translated are left out and counted as failed
+        """
+        last_row = first_row + len(rows) - 1
+        rows, numbers = await self.new_rows(rows, first_row, last_row)
+        if rows is None:
+            return False
+        if not rows:
+            return True
 
-    normalized_cols = {normalize(c): c for c in df.columns}
+        untranslated = set()
+        if self.translate:
+            #whole chunk translated concurrently, limited by the engine
+            failures = await translation_engine.translate_fields(rows, translated_cols, 0)
+            untranslated = {failure["row"] for failure in failures}
+            for failure in failures:
+                failure["row"] = numbers[failure["row"]]
+            self.translation_failures.extend(failures)
+            self.rows_translated += len(rows) - len(untranslated)
 
-    missing_cols = [col for col in db_cols if normalize(col) not in normalized_cols]
-    if missing_cols:
-        raise Exception(
-            f"❌ Missing required columns in uploaded file: {missing_cols}. "
-            f"Please check the column names and try again."
+        if untranslated:
+            #a row inserted with blank fields would be skipped by name on
+            #every retry and never translated, so it stays out and the chunk
+            #isnt done (no checkpoint past it) until a run translates it
+            self.failed_chunks.append({
+                "rows": f"{first_row}-{last_row}",
+                "error": f"{len(untranslated)} rows not translated, see translation_failures"
+            })
+            self.rows_failed += len(untranslated)
+            rows = [row for i, row in enumerate(rows) if i not in untranslated]
+            if not rows:
+                return False
+
+        #insert runs in a thread so the loop isnt blocked on the http call
+        failure = await asyncio.to_thread(
+            insert_chunk, self.endpoint, self.headers, rows, first_row, last_row
         )
-    inserted_count = 0;
-    for idx in range(len(df)):
-        row_raw = {}
-
-        for col in db_cols:
-            key = normalize(col)
-            src_col = normalized_cols.get(key)
-            row_raw[col] = "" if not src_col else str(df.at[idx, src_col])
-
-        if translate:
-            row_data = {}
-            for col in db_cols:
-                if col == "scientific_name":
-                    row_data[col] = row_raw[col]  
-                else:
-                    row_data[col] = await translate_to_tetum(row_raw[col])
-                time.sleep(0.2)
-
-        else:
-            row_data = row_raw
-        
-        response = requests.post(endpoint, headers=headers, data=json.dumps(row_data))
-        if response.status_code >= 300:
-            raise Exception(f"Upload error at row {idx+1}: {response.text}")
-        inserted_count += 1
+        if failure:
+            self.failed_chunks.append(failure)
+            self.rows_failed += len(rows)
+            return False
+        self.rows_inserted += len(rows)
+        return not untranslated
+
+    def result(self):
+        return {
+        "rows_inserted": self.rows_inserted,
+        "rows_skipped": self.rows_skipped,
+        "failed_chunks": self.failed_chunks,
+        "translation_failures": self.translation_failures
+        }
+
+
+async def process_file_dual(
+    file_path: str,
+    chunk_size: int = UPLOAD_CHUNK_SIZE,
+    on_progress=None,
+    should_stop=None,
+    start_row: int = 1,
+    on_checkpoint=None
+):
+    """
+    parses the file once and feeds every chunk to both languages at the same time:
+    english goes straight in, tetum is translated then inserted.
+    wall time is roughly the tetum path alone instead of english + tetum
+
+    on_progress(progress) is called after every chunk with the combined counts.
+    should_stop() is checked between chunks, once it returns True
+    no more chunks are started (those already queued still finish) and the
+    result has "stopped": True
+
+    rows before start_row are skipped (a previous run already wrote them).
+    on_checkpoint(row) is called with the last row number such that every
+    row up to it is in both tables, a later run can resume after it
+    """
+    en_writer = TableWriter("species_en", translate=False)
+    tet_writer = TableWriter("species_tet", translate=True)
+
+    progress = {
+        "start_row": start_row,
+        "rows_parsed": 0,
+        "rows_translated": 0,
+        "en_rows_inserted": 0,
+        "tet_rows_inserted": 0,
+        "en_rows_skipped": 0,
+        "tet_rows_skipped": 0,
+        "rows_failed": 0,
+        "checkpoint_row": start_row - 1,
+    }
+    stopped = False
+
+    #chunks in file order (first row -> last row) until both languages have them
+    pending = collections.OrderedDict()
+    done = {}
+
+    def chunk_done(first_row):
+        done[first_row] = done.get(first_row, 0) + 1
+        advanced = False
+        while pending:
+            first, last = next(iter(pending.items()))
+            if done.get(first) != 2:
+                break
+            pending.popitem(last=False)
+            del done[first]
+            progress["checkpoint_row"] = last
+            advanced = True
+        if advanced and on_checkpoint:
+            on_checkpoint(progress["checkpoint_row"])
+
+    def report():
+        progress["rows_translated"] = tet_writer.rows_translated
+        progress["en_rows_inserted"] = en_writer.rows_inserted
+        progress["tet_rows_inserted"] = tet_writer.rows_inserted
+        progress["en_rows_skipped"] = en_writer.rows_skipped
+        progress["tet_rows_skipped"] = tet_writer.rows_skipped
+        progress["rows_failed"] = en_writer.rows_failed + tet_writer.rows_failed
+        if on_progress:
+            on_progress(dict(progress))
+
+    #small queues so a slow tetum path doesnt pile the whole file up in memory
+    en_queue = asyncio.Queue(maxsize=4)
+    tet_queue = asyncio.Queue(maxsize=4)
+
+    async def produce():
+        nonlocal stopped
+        try:
+            for first_row, chunk in iter_chunks(read_upload_rows(file_path), chunk_size, start_row):
+                if should_stop and should_stop():
+                    stopped = True
+                    break
+                progress["rows_parsed"] += len(chunk)
+                pending[first_row] = first_row + len(chunk) - 1
+                await en_queue.put((first_row, chunk))
+                #tetum translates in place so it gets its own copy
+                await tet_queue.put((first_row, [dict(row) for row in chunk]))
+        finally:
+            await en_queue.put(None)
+            await tet_queue.put(None)
+
+    async def consume(queue, writer):
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            first_row, rows = item
+            if await writer.write(rows, first_row):
+                chunk_done(first_row)
+            report()
+
+    await asyncio.gather(
+        produce(),
+        consume(en_queue, en_writer),
+        consume(tet_queue, tet_writer),
+    )
+    report()
+
     return {
-    "rows_inserted": inserted_count
+        "species_en": en_writer.result(),
+        "species_tet": tet_writer.result(),
+        "progress": progress,
+        "stopped": stopped
     }
@@ -0,0 +1,351 @@
+"""
+diff based import (upload mode "upsert")
+
+admins mostly re-upload the whole master sheet after fixing a few cells.
+instead of inserting every row again, each chunk is compared field by field
+against the species already stored (keyed by scientific_name):
+- new species are inserted into both tables
+- changed species get only their changed english fields re-translated and
+  are upserted (by species_id) in both tables
+- unchanged species cost one lookup and nothing else
+one changelog entry is emitted per new or changed species, with the changed
+fields listed so sync can send field patches
+"""
+
+import asyncio
+import json
+
+import requests
+
+from uploader import (
+    UPLOAD_CHUNK_SIZE,
+    db_cols,
+    translated_cols,
+    translation_engine,
+    http,
+    timed_request,
+    table_target,
+    fetch_existing,
+    read_upload_rows,
+    iter_chunks,
+)
+
+#columns compared against the upload, scientific_name is the key
+DIFF_COLS = [col for col in db_cols if col != "scientific_name"]
+SELECT_COLS = ",".join(["species_id"] + db_cols)
+
+
+def _clean(value):
+    return "" if value is None else str(value).strip()
+
+
+def diff_fields(existing, uploaded):
+    """columns whose uploaded value differs from the stored one"""
+    return [col for col in DIFF_COLS if _clean(existing.get(col)) != _clean(uploaded.get(col))]
+
+
+def post_rows(endpoint, headers, rows, upsert=False):
+    """
+    bulk insert (or upsert on species_id) of rows
+    returns (inserted rows, None) or (None, error)
+    """
+    headers = dict(headers)
+    params = None
+    if upsert:
+        headers["Prefer"] = "resolution=merge-duplicates,return=minimal"
+        params = {"on_conflict": "species_id"}
+    else:
+        #inserted ids are needed for the changelog
+        headers["Prefer"] = "return=representation"
+
+    try:
+        response = timed_request(http.post, endpoint, headers=headers, params=params, data=json.dumps(rows))
+    except requests.RequestException as e:
+        return None, str(e)
+
+    if response.status_code >= 300:
+        return None, response.text
+    return ([] if upsert else response.json()), None
+
+
+class UpsertWriter:
+    """
+    applies chunks to species_en and species_tet by diff.
+    keeps per table counts plus the changelog entries via on_change
+    """
+
+    def __init__(self, on_change=None):
+        self.on_change = on_change
+        self.en_endpoint, self.en_headers = table_target("species_en")
+        self.tet_endpoint, self.tet_headers = table_target("species_tet")
+        self.counts = {
+            table: {"rows_inserted": 0, "rows_updated": 0, "rows_failed": 0}
+            for table in ("species_en", "species_tet")
+        }
+        self.rows_unchanged = 0
+        self.rows_duplicate = 0
+        self.rows_translated = 0
+        self.fields_translated = 0
+        self.species_changed = 0
+        self.failed_chunks = {"species_en": [], "species_tet": []}
+        self.translation_failures = []
+        #names already handled earlier in the file, a repeat would undo the first
+        self._seen = set()
+
+    def _fail(self, table, first_row, last_row, rows, error):
+        self.failed_chunks[table].append({"rows": f"{first_row}-{last_row}", "error": error})
+        self.counts[table]["rows_failed"] += rows
+
+    async def _translate(self, rows, fields, numbers):
+        """
+        translates fields of rows in place
+        returns {(index, field)} that failed, failures are reported with file row numbers
+        """
+        failures = await translation_engine.translate_fields(rows, fields, 0)
+        failed = {(f["row"], f["field"]) for f in failures}
+        for failure in failures:
+            failure["row"] = numbers[failure["row"]]
+        self.translation_failures.extend(failures)
+        return failed
+
+    async def write(self, rows, first_row):
+        """
+        returns True once every row of the chunk matches the upload in both tables
+        """
+        last_row = first_row + len(rows) - 1
+        for row in rows:
+            row["scientific_name"] = row["scientific_name"].strip()
+        names = sorted({row["scientific_name"] for row in rows if row["scientific_name"]})
+
+        en_existing, tet_existing = {}, {}
+        if names:
+            (en_existing, en_err), (tet_existing, tet_err) = await asyncio.gather(
+                asyncio.to_thread(fetch_existing, self.en_endpoint, self.en_headers, names, SELECT_COLS),
+                asyncio.to_thread(fetch_existing, self.tet_endpoint, self.tet_headers, names, SELECT_COLS),
+            )
+            if en_err or tet_err:
+                self._fail("species_en", first_row, last_row, len(rows), en_err or tet_err)
+                return False
+
+        en_new = []         #rows
+        en_updates = []     #full rows with species_id
+        tet_new = []        #(file row number, row) translated in full
+        tet_patches = []    #(file row number, stored row, {changed col: english})
+        changes = {}        #name -> {"species_en": {...}, "species_tet": {...}}
+        tet_only = []       #names stored in english but missing in tetum
+
+        for number, row in enumerate(rows, first_row):
+            name = row["scientific_name"]
+            if name and name in self._seen:
+                self.rows_duplicate += 1
+                continue
+            if name:
+                self._seen.add(name)
+
+            stored_en = en_existing.get(name) if name else None
+            stored_tet = tet_existing.get(name) if name else None
+            changed = []
+
+            if stored_en is None:
+                en_new.append(row)
+            else:
+                changed = diff_fields(stored_en, row)
+                if changed:
+                    en_updates.append({**stored_en, **{col: row[col] for col in changed}})
+                    changes[name] = {"species_en": {col: row[col] for col in changed}}
+
+            if stored_tet is None:
+                tet_new.append((number, dict(row)))
+                if stored_en is not None:
+                    tet_only.append(name)
+            elif changed:
+                patch = {col: row[col] for col in changed if col in translated_cols}
+                tet_patches.append((number, stored_tet, patch))
+
+            if stored_en is not None and stored_tet is not None and not changed:
+                self.rows_unchanged += 1
+
+        #rows that couldnt be translated in full are held back: a tetum row
+        #inserted with blanks (or an english update applied without its tetum
+        #one) would look done to a retry and never be translated again
+        untranslated = 0
+
+        #tetum: whole rows for new species, only the changed fields otherwise
+        tet_rows = []
+        if tet_new:
+            new_rows = [row for _, row in tet_new]
+            failed = await self._translate(new_rows, translated_cols, [n for n, _ in tet_new])
+            failed = {i for i, _ in failed}
+            tet_rows = [row for i, row in enumerate(new_rows) if i not in failed]
+            held = {new_rows[i]["scientific_name"] for i in failed}
+            tet_only = [name for name in tet_only if name not in held]
+            untranslated += len(failed)
+            self.rows_translated += len(tet_rows)
+
+        tet_updates = []
+        if tet_patches:
+            partial = [dict(patch) for _, _, patch in tet_patches]
+            failed = await self._translate(partial, translated_cols, [n for n, _, _ in tet_patches])
+            held = set()
+            for i, (_, stored, patch) in enumerate(tet_patches):
+                #fields that did translate are written, the english update
+                #waits so the next run diffs and translates the rest
+                translated = {
+                    col: partial[i][col] for col in patch if (i, col) not in failed
+                }
+                self.fields_translated += len(translated)
+                if translated:
+                    tet_updates.append({**stored, **translated})
+                name = stored["scientific_name"]
+                changes[name]["species_tet"] = translated
+                if len(translated) < len(patch):
+                    held.add(name)
+                    changes[name].pop("species_en", None)
+            en_updates = [row for row in en_updates if row["scientific_name"] not in held]
+            untranslated += len(held)
+            self.rows_translated += len(tet_patches) - len(held)
+
+        if untranslated:
+            self._fail(
+                "species_tet", first_row, last_row, untranslated,
+                f"{untranslated} rows not translated, see translation_failures"
+            )
+
+        #inserts english first, so tetum never has a species english lacks.
+        #updates tetum first: the english update is what marks a species
+        #as done (the diff comes out empty), so if anything fails before it
+        #a retry diffs again and rewrites the tetum fields too
+        writes = [
+            ("species_en", self.en_endpoint, self.en_headers, en_new, False),
+            ("species_tet", self.tet_endpoint, self.tet_headers, tet_rows, False),
+            ("species_tet", self.tet_endpoint, self.tet_headers, tet_updates, True),
+            ("species_en", self.en_endpoint, self.en_headers, en_updates, True),
+        ]
+        en_inserted = []
+        written = set()     #(table, upsert) that went through
+        ok = True
+        for table, endpoint, headers, batch, upsert in writes:
+            if not batch:
+                continue
+            rows_written, error = await asyncio.to_thread(post_rows, endpoint, headers, batch, upsert)
+            if error is not None:
+                self._fail(table, first_row, last_row, len(batch), error)
+                ok = False
+                break
+            written.add((table, upsert))
+            self.counts[table]["rows_updated" if upsert else "rows_inserted"] += len(batch)
+            if table == "species_en" and not upsert:
+                en_inserted = rows_written
+
+        #whatever reached the database is logged, even if a later write failed
+        if ("species_tet", False) not in written:
+            tet_only = []
+        logged = {}
+        for name, fields in changes.items():
+            fields = {
+                table: cols for table, cols in fields.items()
+                if (table, True) in written and cols
+            }
+            if fields:
+                logged[name] = fields
+        self._log_changes(en_inserted, tet_only, logged, en_existing)
+        return ok and not untranslated
+
+    def _log_changes(self, en_inserted, tet_only, changes, en_existing):
+        """
+        one changelog entry per new or changed species, keyed by its english id.
+        a species that got a new row in either table is resent whole
+        """
+        entries = {}
+        for row in en_inserted:
+            entries[row["species_id"]] = ("INSERT", None)
+        for name in tet_only:
+            entries[en_existing[name]["species_id"]] = ("INSERT", None)
+        for name, fields in changes.items():
+            entries.setdefault(en_existing[name]["species_id"], ("UPDATE", {"fields": fields}))
+
+        self.species_changed += len(entries)
+        if self.on_change:
+            for species_id, (operation, payload) in entries.items():
+                self.on_change(species_id, operation, payload)
+
+    def result(self, table):
+        return {
+            **self.counts[table],
+            "failed_chunks": self.failed_chunks[table],
+            "translation_failures": self.translation_failures if table == "species_tet" else [],
+        }
+
+
+async def process_file_upsert(
+    file_path: str,
+    chunk_size: int = UPLOAD_CHUNK_SIZE,
+    on_progress=None,
+    should_stop=None,
+    start_row: int = 1,
+    on_checkpoint=None,
+    on_change=None
+):
+    """
+    diff based counterpart of uploader.process_file_dual, same arguments and
+    result shape. on_change(species_id, operation, payload) is called once per
+    new or changed species
+    """
+    writer = UpsertWriter(on_change)
+    progress = {
+        "start_row": start_row,
+        "rows_parsed": 0,
+        "rows_translated": 0,
+        "fields_translated": 0,
+        "en_rows_inserted": 0,
+        "tet_rows_inserted": 0,
+        "en_rows_updated": 0,
+        "tet_rows_updated": 0,
+        "rows_unchanged": 0,
+        "rows_duplicate": 0,
+        "rows_failed": 0,
+        "species_changed": 0,
+        "checkpoint_row": start_row - 1,
+    }
+    stopped = False
+    #every chunk so far went through, the checkpoint can move
+    in_order = True
+
+    def report():
+        en, tet = writer.counts["species_en"], writer.counts["species_tet"]
+        progress.update({
+            "rows_translated": writer.rows_translated,
+            "fields_translated": writer.fields_translated,
+            "en_rows_inserted": en["rows_inserted"],
+            "tet_rows_inserted": tet["rows_inserted"],
+            "en_rows_updated": en["rows_updated"],
+            "tet_rows_updated": tet["rows_updated"],
+            "rows_unchanged": writer.rows_unchanged,
+            "rows_duplicate": writer.rows_duplicate,
+            "rows_failed": en["rows_failed"] + tet["rows_failed"],
+            "species_changed": writer.species_changed,
+        })
+        if on_progress:
+            on_progress(dict(progress))
+
+    for first_row, chunk in iter_chunks(read_upload_rows(file_path), chunk_size, start_row):
+        if should_stop and should_stop():
+            stopped = True
+            break
+        progress["rows_parsed"] += len(chunk)
+
+        ok = await writer.write(chunk, first_row)
+        in_order = in_order and ok
+        if in_order:
+            progress["checkpoint_row"] = first_row + len(chunk) - 1
+            if on_checkpoint:
+                on_checkpoint(progress["checkpoint_row"])
+        report()
+    report()
+
+    return {
+        "species_en": writer.result("species_en"),
+        "species_tet": writer.result("species_tet"),
+        "progress": progress,
+        "stopped": stopped
+    }
@@ -3,10 +3,11 @@ from rich.console import Console
 from rich.table import Table
 
 from .services import (
-    load_species_df,
-    list_species,
-    filter_species,
-    get_species_by_scientific_name,
+    species_columns,
+    iter_species_rows,
+    take_species,
+    filter_species_rows,
+    find_species,
 )
 
 app = typer.Typer(help="Species Database CLI")
@@ -18,19 +19,18 @@ def list_all(limit: int = typer.Option(10, help="Number of species to show (0 =
     """
     List species from the database.
     """
-    df = load_species_df()
-    data = list_species(df, limit=None if limit == 0 else limit)
+    rows = take_species(iter_species_rows(), limit=None if limit == 0 else limit)
 
     table = Table(title="Species List")
     table.add_column("Scientific name")
     table.add_column("Common name")
     table.add_column("Habitat")
 
-    for _, row in data.iterrows():
+    for row in rows:
         table.add_row(
-            str(row.get("Scientific name", "")),
-            str(row.get("Common name", "")),
-            str(row.get("Habitat", "")),
+            row.get("Scientific name", ""),
+            row.get("Common name", ""),
+            row.get("Habitat", ""),
         )
 
     console.print(table)
@@ -47,9 +47,9 @@ def search(
     """
     Search species with multiple filters.
     """
-    df = load_species_df()
-    result = filter_species(
-        df,
+    columns = species_columns()
+    result = filter_species_rows(
+        iter_species_rows(),
         scientific_name=scientific_name,
         common_name=common_name,
         habitat=habitat,
@@ -57,16 +57,16 @@ def search(
         pest=pest,
     )
 
-    if result.empty:
-        console.print("No species found with these filters.")
-        raise typer.Exit(code=0)
-
     table = Table(title="Search Results")
-    for col in result.columns:
-        table.add_column(str(col))
+    for col in columns:
+        table.add_column(col)
 
-    for _, row in result.iterrows():
-        table.add_row(*[str(v) for v in row.values])
+    for row in result:
+        table.add_row(*[row.get(col, "") for col in columns])
+
+    if not table.row_count:
+        console.print("No species found with these filters.")
+        raise typer.Exit(code=0)
 
     console.print(table)
 
@@ -76,8 +76,7 @@ def show(scientific_name: str = typer.Argument(..., help="Exact scientific name"
     """
     Show full details for one species by scientific name.
     """
-    df = load_species_df()
-    species = get_species_by_scientific_name(df, scientific_name)
+    species = find_species(iter_species_rows(), scientific_name)
 
     if species is None:
         console.print(f"No species found with scientific name: {scientific_name}")
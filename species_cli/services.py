@@ -1,83 +1,80 @@
+from itertools import islice
 from pathlib import Path
-import pandas as pd
+
+# Shared with the upload backend. The CLI runs from the project root
+# (python -m species_cli.cli), where backend/ imports as a namespace package.
+from backend.file_reader import SheetReader
 
 # Default path: project_root/data/species.xlsx
 DATA_PATH = Path(__file__).resolve().parent.parent / "data" / "species.xlsx"
 
+# search filters -> sheet column
+FILTER_COLUMNS = {
+    "scientific_name": "Scientific name",
+    "common_name": "Common name",
+    "habitat": "Habitat",
+    "leaf_type": "Leaf type",
+    "pest": "Pest",
+}
 
-def load_species_df(path: str | Path | None = None) -> pd.DataFrame:
-    """
-    Load the species Excel file into a pandas DataFrame.
-    """
-    excel_path = Path(path) if path else DATA_PATH
-
-    if not excel_path.exists():
-        raise FileNotFoundError(f"Species file not found at: {excel_path}")
-
-    df = pd.read_excel(excel_path)
-
-    # Normalise column names: strip spaces
-    df.columns = [c.strip() for c in df.columns]
 
-    return df
+def _species_path(path: str | Path | None) -> Path:
+    species_path = Path(path) if path else DATA_PATH
+    if not species_path.exists():
+        raise FileNotFoundError(f"Species file not found at: {species_path}")
+    return species_path
 
 
-def list_species(df: pd.DataFrame, limit: int | None = None) -> pd.DataFrame:
+def species_columns(path: str | Path | None = None) -> list[str]:
     """
-    Return a subset of species, optionally limited to N rows.
+    Column names of the species file (XLSX or CSV), as written in its header.
     """
-    if limit is None:
-        return df
-    return df.head(limit)
+    with SheetReader(str(_species_path(path))) as sheet:
+        return list(sheet.columns)
 
 
-def filter_species(
-    df: pd.DataFrame,
-    scientific_name: str | None = None,
-    common_name: str | None = None,
-    habitat: str | None = None,
-    leaf_type: str | None = None,
-    pest: str | None = None,
-) -> pd.DataFrame:
+def iter_species_rows(path: str | Path | None = None):
     """
-    Filter species based on optional criteria (contains search).
+    Stream the species file (XLSX or CSV) one row at a time as dicts keyed
+    by column name, every value a str ("" for blank cells). Uses the
+    backend's SheetReader, so headers, blank rows and encodings are handled
+    the same way as uploads. Only the current row is held in memory.
     """
-    filtered = df.copy()
+    with SheetReader(str(_species_path(path))) as sheet:
+        columns = sheet.columns
+        for values in sheet.iter_values():
+            if any(v.strip() for v in values):
+                yield dict(zip(columns, values))
 
-    if scientific_name:
-        filtered = filtered[
-            filtered["Scientific name"].str.contains(scientific_name, case=False, na=False)
-        ]
 
-    if common_name:
-        filtered = filtered[
-            filtered["Common name"].str.contains(common_name, case=False, na=False)
-        ]
-
-    if habitat:
-        filtered = filtered[
-            filtered["Habitat"].str.contains(habitat, case=False, na=False)
-        ]
-
-    if leaf_type:
-        filtered = filtered[
-            filtered["Leaf type"].str.contains(leaf_type, case=False, na=False)
-        ]
+def filter_species_rows(rows, **filters):
+    """
+    Rows matching every given filter (case insensitive contains), see
+    FILTER_COLUMNS for the filter names. Lazy, so it streams with the rows.
+    """
+    wanted = {
+        FILTER_COLUMNS[name]: value.lower()
+        for name, value in filters.items() if value
+    }
+    for row in rows:
+        if all(needle in row.get(col, "").lower() for col, needle in wanted.items()):
+            yield row
 
-    if pest:
-        filtered = filtered[
-            filtered["Pest"].str.contains(pest, case=False, na=False)
-        ]
 
-    return filtered
+def find_species(rows, scientific_name: str):
+    """
+    First row whose scientific name matches exactly (case insensitive),
+    stops reading as soon as it is found. None if there is none.
+    """
+    target = scientific_name.lower()
+    for row in rows:
+        if row.get("Scientific name", "").lower() == target:
+            return row
+    return None
 
 
-def get_species_by_scientific_name(df: pd.DataFrame, scientific_name: str):
+def take_species(rows, limit: int | None = None):
     """
-    Get a single species by exact scientific name.
+    At most limit rows (all when limit is None), without reading further.
     """
-    mask = df["Scientific name"].str.lower() == scientific_name.lower()
-    match = df[mask]
-    if match.empty:
-        return None
-    return match.iloc[0]
+    return rows if limit is None else islice(rows, limit)